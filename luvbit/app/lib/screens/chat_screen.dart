@@ -1,11 +1,10 @@
 import 'package:flutter/material.dart';
 import 'package:Luvbit/services/api_service.dart';
-import 'dart:convert';
 
 class ChatScreen extends StatefulWidget {
   final int partnerId;
   final String partnerNickname;
-  final String? partnerProfileImage;
+  final String? partnerProfileImage; // プロフィール画像URL
 
   const ChatScreen({
     super.key,
@@ -76,9 +75,9 @@ class _ChatScreenState extends State<ChatScreen> {
   Future<void> _loadMyProfile() async {
     try {
       final userInfo = await ApiService.getUserInfo();
-      if (userInfo != null && userInfo['profile_image'] != null) {
+      if (userInfo != null && userInfo['profile_image_thumbnail_url'] != null) {
         setState(() {
-          _myProfileImage = userInfo['profile_image'];
+          _myProfileImage = userInfo['profile_image_thumbnail_url'];
         });
       }
     } catch (e) {
@@ -166,15 +165,10 @@ class _ChatScreenState extends State<ChatScreen> {
   /// 相手のプロフィール画像を構築
   Widget _buildProfileImage({double size = 40}) {
     if (widget.partnerProfileImage != null && widget.partnerProfileImage!.isNotEmpty) {
-      try {
-        final bytes = base64Decode(widget.partnerProfileImage!);
-        return CircleAvatar(
-          radius: size / 2,
-          backgroundImage: MemoryImage(bytes),
-        );
-      } catch (e) {
-        print('プロフィール画像デコードエラー: $e');
-      }
+      return CircleAvatar(
+        radius: size / 2,
+        backgroundImage: NetworkImage('${ApiService.baseUrl}${widget.partnerProfileImage}'),
+      );
     }
     
     return CircleAvatar(
@@ -191,15 +185,10 @@ class _ChatScreenState extends State<ChatScreen> {
   /// 自分のプロフィール画像を構築
   Widget _buildMyProfileImage({double size = 40}) {
     if (_myProfileImage != null && _myProfileImage!.isNotEmpty) {
-      try {
-        final bytes = base64Decode(_myProfileImage!);
-        return CircleAvatar(
-          radius: size / 2,
-          backgroundImage: MemoryImage(bytes),
-        );
-      } catch (e) {
-        print('自分のプロフィール画像デコードエラー: $e');
-      }
+      return CircleAvatar(
+        radius: size / 2,
+        backgroundImage: NetworkImage('${ApiService.baseUrl}$_myProfileImage'),
+      );
     }
     
     return CircleAvatar(
@@ -1,5 +1,5 @@
 import 'package:flutter/material.dart';
-import 'dart:convert';
+import 'package:Luvbit/services/api_service.dart';
 import 'chat_screen.dart';
 
 class MatchingResultScreen extends StatelessWidget {
@@ -14,24 +14,18 @@ class MatchingResultScreen extends StatelessWidget {
 
   /// プロフィール画像を構築するメソッド
   Widget _buildProfileImage() {
-    final profileImageBase64 = matchedUser?['profile_image'];
+    final profileImageUrl = matchedUser?['profile_image_url'];
     
-    if (profileImageBase64 != null && profileImageBase64.isNotEmpty) {
-      try {
-        final bytes = base64Decode(profileImageBase64);
-        return Image.memory(
-          bytes,
-          fit: BoxFit.cover,
-          width: 150,
-          height: 150,
-          errorBuilder: (context, error, stackTrace) {
-            return _buildDefaultProfileImage();
-          },
-        );
-      } catch (e) {
-        print('プロフィール画像のデコードエラー: $e');
-        return _buildDefaultProfileImage();
-      }
+    if (profileImageUrl != null && profileImageUrl.isNotEmpty) {
+      return Image.network(
+        '${ApiService.baseUrl}$profileImageUrl',
+        fit: BoxFit.cover,
+        width: 150,
+        height: 150,
+        errorBuilder: (context, error, stackTrace) {
+          return _buildDefaultProfileImage();
+        },
+      );
     }
     
     return _buildDefaultProfileImage();
@@ -208,7 +202,7 @@ class MatchingResultScreen extends StatelessWidget {
                                     builder: (context) => ChatScreen(
                                       partnerId: matchedUser!['user_id'],
                                       partnerNickname: matchedUser!['nickname'] ?? '未設定',
-                                      partnerProfileImage: matchedUser!['profile_image'],
+                                      partnerProfileImage: matchedUser!['profile_image_url'],
                                     ),
                                   ),
                                 );
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from core.db import get_db
 from models.user import User
+from services.profile_image_service import ProfileImageService
 import os
 
 # --- DB接続設定（例：PostgreSQL） ---
@@ -11,7 +12,7 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 
 def insert_image(image_path: str):
-    """画像ファイルをBLOBカラムに挿入する関数"""
+    """画像ファイルをブロブストアに保存してユーザーに設定する関数"""
     session = next(get_db())
 
     try:
@@ -21,7 +22,11 @@ def insert_image(image_path: str):
 
         # Imageオブジェクト作成
         user = session.query(User).filter(User.id == 1).first()
-        user.profile_image = image_data
+        user.profile_image_hash = ProfileImageService.store_original(image_data)
+
+        # 縮小版・WebP版を作成
+        renditions = ProfileImageService.render_all(image_data)
+        session.execute(ProfileImageService.save_renditions_statement(user.profile_image_hash, renditions))
 
         # DBに追加
         session.commit()
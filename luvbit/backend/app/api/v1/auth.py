@@ -2,8 +2,10 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from core.security import verify_password, create_access_token
-from core.db import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.security import verify_password_async, create_access_token
+from core.db import get_db, get_async_db
 from models.user import User
 from schemas.auth import Token
 from services.satellite_service import SatelliteService
@@ -13,62 +15,64 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"login")
 
 @router.post("/login", response_model=Token)
 async def login(
-    form_data: OAuth2PasswordRequestForm = Depends()
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ユーザーログイン処理
     
     Args:
         form_data: ログインフォームデータ
+        db: データベースセッション
     """
 
-    db_session = next(get_db())
-
-    try:
-        # ユーザー情報の取得
-        user = db_session.query(User).filter(
+    # ユーザー情報の取得
+    result = await db.execute(
+        select(User.id, User.uuid, User.email, User.nick_name, User.password).where(
             User.email == form_data.username
-        ).first()
+        )
+    )
+    user = result.first()
         
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect email or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-
-        # パスワードの検証
-        if not verify_password(form_data.password, user.password):            
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect email or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-        # JWTトークンの生成（ペイロードに店舗UUIDとユーザーIDを含める）
-        access_token_expires = timedelta(minutes=30)
-        access_token = create_access_token(
-            data={
-                "sub": user.email,
-                "user_id": user.id
-            },
-            expires_delta=access_token_expires
+    # パスワードの検証
+    if not await verify_password_async(form_data.password, user.password):            
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
         )
 
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
+    # JWTトークンの生成（認証時にDBを参照しなくて済むようユーザー情報を含める）
+    access_token_expires = timedelta(minutes=30)
+    access_token = create_access_token(
+        data={
+            "sub": user.email,
             "user_id": user.id,
-        }
+            "uuid": user.uuid,
+            "nick_name": user.nick_name
+        },
+        expires_delta=access_token_expires
+    )
 
-    finally:
-        db_session.close()
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user_id": user.id,
+    }
 
 
 @router.post("/validate")
 async def validate_token(
     token: str = Form(...),
-    response_model=Token
+    response_model=Token,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     トークン検証処理
@@ -105,15 +109,15 @@ async def validate_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 店舗DBセッションの取得
-    db_session = next(get_db())
-    
     try:
         # 店舗ユーザー情報の取得
-        user = db_session.query(User).filter(
-            User.email == email,
-            User.id == user_id
-        ).first()
+        result = await db.execute(
+            select(User).where(
+                User.email == email,
+                User.id == user_id
+            )
+        )
+        user = result.scalars().first()
         
         if not user:
             raise HTTPException(
@@ -144,8 +148,6 @@ async def validate_token(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
-    finally:
-        db_session.close()
 
 
 def get_current_user(
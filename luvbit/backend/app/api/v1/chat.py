@@ -1,19 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc, func
+import asyncio
+import time
+from fastapi import (
+    APIRouter, Depends, HTTPException, status, Query, Header, Response,
+    WebSocket, WebSocketDisconnect
+)
+from sqlalchemy import select, update, or_, and_, desc, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import base64
 
-from core.db import get_db
+from core.db import get_async_db, AsyncSessionLocal
 from core.security import get_current_user
 from models.user import User
 from models.chat_room import ChatRoom
 from models.message import Message
 from schemas.chat import (
     ChatRoomCreate, ChatRoomInfo, ChatRoomResponse,
-    MessageCreate, MessageInfo, MessageListResponse
+    MessageCreate, MessageInfo, MessageListResponse, MessageSyncResponse,
+    MarkReadRequest, MarkReadResponse, UnreadCountResponse,
+    MessageSearchHit, MessageSearchResponse
 )
 from schemas.auth import UserInfo
+from services.chat_cache import MessageCountCache
+from services.chat_hub import ChatHub
+from services.chat_room_service import ChatRoomService
+from services.message_cursor import encode_cursor, decode_cursor
+from services.message_search import build_snippet, escape_like
+from services.message_writer import MessageWriterConfig, MessageGroupCommitter, write_message
+from services.profile_image_service import ProfileImageConfig, ProfileImageService
 
 router = APIRouter()
 
@@ -21,7 +34,7 @@ router = APIRouter()
 async def create_chat_room(
     request: ChatRoomCreate,
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     チャットルームを作成
@@ -35,14 +48,6 @@ async def create_chat_room(
         ChatRoomResponse: チャットルーム作成結果
     """
     try:
-        # 相手のユーザーが存在するかチェック
-        partner_user = db.query(User).filter(User.id == request.partner_user_id).first()
-        if not partner_user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="指定されたユーザーが見つかりません"
-            )
-        
         # 自分と同じユーザーとのチャットルーム作成を防ぐ
         if current_user.id == request.partner_user_id:
             raise HTTPException(
@@ -50,43 +55,30 @@ async def create_chat_room(
                 detail="自分自身とはチャットできません"
             )
         
-        # 既存のチャットルームがあるかチェック（双方向チェック）
-        existing_room = db.query(ChatRoom).filter(
-            or_(
-                and_(ChatRoom.user1_id == current_user.id, ChatRoom.user2_id == request.partner_user_id),
-                and_(ChatRoom.user1_id == request.partner_user_id, ChatRoom.user2_id == current_user.id)
-            )
-        ).first()
-        
-        if existing_room:
-            return ChatRoomResponse(
-                id=existing_room.id,
-                partner_nickname=partner_user.nick_name,
-                message="既存のチャットルームを使用します"
-            )
-        
-        # 新しいチャットルームを作成
-        # user1_idには小さいID、user2_idには大きいIDを設定して一意性を保つ
-        user1_id = min(current_user.id, request.partner_user_id)
-        user2_id = max(current_user.id, request.partner_user_id)
-        
-        new_room = ChatRoom(
-            user1_id=user1_id,
-            user2_id=user2_id
+        # 相手が存在する場合のみ作成し、既存のルームがあればそのIDを返す
+        # （同時に作成されても unique_user_pair 違反にならない）
+        result = await db.execute(
+            ChatRoomService.get_or_create_query(current_user.id, request.partner_user_id)
         )
+        row = result.first()
+        await db.commit()
         
-        db.add(new_room)
-        db.commit()
-        db.refresh(new_room)
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="指定されたユーザーが見つかりません"
+            )
         
         return ChatRoomResponse(
-            id=new_room.id,
-            partner_nickname=partner_user.nick_name,
-            message="チャットルームが作成されました"
+            id=row.id,
+            partner_nickname=row.nick_name,
+            message="チャットルームが作成されました" if row.created else "既存のチャットルームを使用します"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"チャットルーム作成エラー: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -96,7 +88,7 @@ async def create_chat_room(
 @router.get("/rooms", response_model=List[ChatRoomInfo])
 async def get_chat_rooms(
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     自分のチャットルーム一覧を取得
@@ -109,50 +101,22 @@ async def get_chat_rooms(
         List[ChatRoomInfo]: チャットルーム一覧
     """
     try:
-        # 自分が参加しているチャットルームを取得
-        chat_rooms = db.query(ChatRoom).filter(
-            or_(
-                ChatRoom.user1_id == current_user.id,
-                ChatRoom.user2_id == current_user.id
-            )
-        ).order_by(desc(ChatRoom.updated_at)).all()
+        # 自分が参加しているチャットルームを1クエリで取得（ルームごとに1行）
+        rows = (await db.execute(ChatRoomService.inbox_query(current_user.id))).all()
         
         result = []
-        for room in chat_rooms:
-            # 相手のユーザー情報を取得
-            partner = room.get_partner(current_user.id)
-            
-            # 最新メッセージを取得
-            last_message = db.query(Message).filter(
-                Message.chat_room_id == room.id
-            ).order_by(desc(Message.created_at)).first()
-            
-            # 未読メッセージ数を取得
-            unread_count = db.query(Message).filter(
-                and_(
-                    Message.chat_room_id == room.id,
-                    Message.sender_id != current_user.id,
-                    Message.is_read == False
-                )
-            ).count()
-            
-            # プロフィール画像をBase64エンコード
-            profile_image_base64 = None
-            if partner.profile_image:
-                try:
-                    profile_image_base64 = base64.b64encode(partner.profile_image).decode('utf-8')
-                except Exception as e:
-                    print(f"Profile image encoding error: {e}")
-            
+        for row in rows:
             result.append(ChatRoomInfo(
-                id=room.id,
-                partner_id=room.get_partner_id(current_user.id),
-                partner_nickname=partner.nick_name,
-                partner_profile_image=profile_image_base64,
-                last_message=last_message.message_text if last_message else None,
-                last_message_time=last_message.created_at if last_message else None,
-                unread_count=unread_count,
-                created_at=room.created_at
+                id=row.id,
+                partner_id=row.partner_id,
+                partner_nickname=row.nick_name,
+                partner_profile_image_url=ProfileImageService.url_for(
+                    row.partner_id, row.profile_image_hash, ProfileImageConfig.THUMBNAIL_SIZE, 'webp'
+                ),
+                last_message=row.message_text,
+                last_message_time=row.last_message_time,
+                unread_count=row.unread_count,
+                created_at=row.created_at
             ))
         
         return result
@@ -167,35 +131,55 @@ async def get_chat_rooms(
 @router.get("/rooms/{room_id}/messages", response_model=MessageListResponse)
 async def get_messages(
     room_id: int,
-    page: int = Query(1, ge=1, description="ページ番号"),
+    before: Optional[str] = Query(None, description="このカーソルより古いメッセージを取得"),
+    after: Optional[str] = Query(None, description="このカーソルより新しいメッセージを取得"),
+    page: int = Query(1, ge=1, description="ページ番号（非推奨: before/afterを使用）"),
     limit: int = Query(50, ge=1, le=100, description="1ページあたりのメッセージ数"),
+    include_total: bool = Query(False, description="メッセージ総数を含めるか"),
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     チャットルームのメッセージ一覧を取得
     
+    (created_at, id) によるカーソルページングで、どのページも同じコストで取得できる
+    
     Args:
         room_id: チャットルームID
-        page: ページ番号
+        before: このカーソルより古いメッセージを取得（前ページのnext_cursor）
+        after: このカーソルより新しいメッセージを取得（前ページのprev_cursor）
+        page: ページ番号（カーソル未指定時のみ使用）
         limit: 1ページあたりのメッセージ数
+        include_total: メッセージ総数を含めるか（キャッシュを使用）
         current_user: ログイン中のユーザー情報
         db: データベースセッション
     
     Returns:
-        MessageListResponse: メッセージ一覧
+        MessageListResponse: メッセージ一覧（新しい順）
     """
     try:
+        try:
+            before_key = decode_cursor(before)
+            after_key = decode_cursor(after)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
         # チャットルームが存在し、自分が参加者かチェック
-        chat_room = db.query(ChatRoom).filter(
-            and_(
-                ChatRoom.id == room_id,
-                or_(
-                    ChatRoom.user1_id == current_user.id,
-                    ChatRoom.user2_id == current_user.id
+        result = await db.execute(
+            select(ChatRoom.id).where(
+                and_(
+                    ChatRoom.id == room_id,
+                    or_(
+                        ChatRoom.user1_id == current_user.id,
+                        ChatRoom.user2_id == current_user.id
+                    )
                 )
             )
-        ).first()
+        )
+        chat_room = result.first()
         
         if not chat_room:
             raise HTTPException(
@@ -203,23 +187,52 @@ async def get_messages(
                 detail="チャットルームが見つからないか、アクセス権限がありません"
             )
         
-        # メッセージの総数を取得
-        total_count = db.query(Message).filter(Message.chat_room_id == room_id).count()
+        # メッセージの総数を取得（指定時のみ、キャッシュを優先）
+        total_count = None
+        if include_total:
+            total_count = MessageCountCache.get(room_id)
+            if total_count is None:
+                total_count = await db.scalar(
+                    select(func.count(Message.id)).where(Message.chat_room_id == room_id)
+                )
+                MessageCountCache.put(room_id, total_count)
         
-        # メッセージを取得（新しい順）
-        offset = (page - 1) * limit
-        messages = db.query(Message).filter(
+        # メッセージを取得（idx_messages_room_created_id を使用）
+        query = select(
+            Message,
+            User.nick_name
+        ).join(
+            User, User.id == Message.sender_id
+        ).where(
             Message.chat_room_id == room_id
-        ).order_by(desc(Message.created_at)).offset(offset).limit(limit).all()
+        )
+        message_key = tuple_(Message.created_at, Message.id)
+        if after_key is not None:
+            # 新しい方向へ: 古い順に取得してから並べ替える
+            query = query.where(message_key > tuple_(*after_key)).order_by(
+                Message.created_at, Message.id
+            )
+        else:
+            if before_key is not None:
+                query = query.where(message_key < tuple_(*before_key))
+            query = query.order_by(desc(Message.created_at), desc(Message.id))
+            if before_key is None and page > 1:
+                query = query.offset((page - 1) * limit)
+        
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after_key is not None:
+            rows.reverse()
         
         # レスポンス用のメッセージリストを作成
         message_list = []
-        for msg in messages:
+        for msg, sender_nickname in rows:
             message_list.append(MessageInfo(
                 id=msg.id,
                 chat_room_id=msg.chat_room_id,
                 sender_id=msg.sender_id,
-                sender_nickname=msg.sender.nick_name,
+                sender_nickname=sender_nickname,
                 message_text=msg.message_text,
                 message_type=msg.message_type,
                 is_read=msg.is_read,
@@ -229,9 +242,14 @@ async def get_messages(
         
         return MessageListResponse(
             messages=message_list,
-            total_count=total_count
+            total_count=total_count,
+            next_cursor=encode_cursor(message_list[-1].created_at, message_list[-1].id) if message_list else before,
+            prev_cursor=encode_cursor(message_list[0].created_at, message_list[0].id) if message_list else after,
+            has_more=has_more
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"メッセージ一覧取得エラー: {e}")
         raise HTTPException(
@@ -239,12 +257,162 @@ async def get_messages(
             detail=f"メッセージ一覧の取得に失敗しました: {str(e)}"
         )
 
+@router.get("/rooms/{room_id}/sync", response_model=MessageSyncResponse)
+async def sync_messages(
+    room_id: int,
+    response: Response,
+    since_id: int = Query(0, ge=0, description="取得済みの最大メッセージID"),
+    wait: int = Query(0, ge=0, le=60, description="変更が無い場合に待機する最大秒数（ロングポーリング）"),
+    limit: int = Query(100, ge=1, le=500, description="取得する最大メッセージ数"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    メッセージの差分同期
+    
+    since_idより新しいメッセージと、既読状態（参加者ごとの既読済み最大メッセージID）を返す。
+    変更が無い場合はIf-None-Matchに対して304を返し、waitを指定した場合は変更があるまで待機する
+    
+    Args:
+        room_id: チャットルームID
+        response: レスポンス（ETagヘッダーの設定用）
+        since_id: 取得済みの最大メッセージID（前回のhigh_water_mark）
+        wait: ロングポーリングの最大待機秒数
+        limit: 取得する最大メッセージ数
+        if_none_match: 前回のETag
+        current_user: ログイン中のユーザー情報
+        db: データベースセッション
+    
+    Returns:
+        MessageSyncResponse: 差分（変更が無い場合は304）
+    """
+    queue = ChatHub.subscribe(current_user.id) if wait > 0 else None
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            # 既読状態と最新メッセージIDのみを取得（ETagの計算用）
+            result = await db.execute(
+                select(
+                    ChatRoom.user1_id,
+                    ChatRoom.last_message_id,
+                    ChatRoom.user1_last_read_message_id,
+                    ChatRoom.user2_last_read_message_id
+                ).where(
+                    and_(
+                        ChatRoom.id == room_id,
+                        or_(
+                            ChatRoom.user1_id == current_user.id,
+                            ChatRoom.user2_id == current_user.id
+                        )
+                    )
+                )
+            )
+            room_state = result.first()
+            
+            if not room_state:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="チャットルームが見つからないか、アクセス権限がありません"
+                )
+            
+            if room_state.user1_id == current_user.id:
+                my_last_read = room_state.user1_last_read_message_id
+                partner_last_read = room_state.user2_last_read_message_id
+            else:
+                my_last_read = room_state.user2_last_read_message_id
+                partner_last_read = room_state.user1_last_read_message_id
+            
+            last_message_id = room_state.last_message_id or 0
+            etag = f'"{room_id}-{max(last_message_id, since_id)}-{my_last_read}-{partner_last_read}"'
+            has_new_messages = last_message_id > since_id
+            unchanged = (etag == if_none_match) if if_none_match else not has_new_messages
+            
+            remaining = deadline - time.monotonic()
+            if not unchanged or queue is None or remaining <= 0:
+                break
+            
+            # 待機中はDB接続をプールへ返却する
+            await db.rollback()
+            try:
+                while True:
+                    event = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    if event.get("chat_room_id") == room_id:
+                        break
+                    remaining = deadline - time.monotonic()
+            except asyncio.TimeoutError:
+                pass
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"メッセージ差分同期エラー: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"メッセージの同期に失敗しました: {str(e)}"
+        )
+    finally:
+        if queue is not None:
+            ChatHub.unsubscribe(current_user.id, queue)
+    
+    if if_none_match and etag == if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    try:
+        rows = []
+        if has_new_messages:
+            rows = (await db.execute(
+                select(
+                    Message,
+                    User.nick_name
+                ).join(
+                    User, User.id == Message.sender_id
+                ).where(
+                    and_(Message.chat_room_id == room_id, Message.id > since_id)
+                ).order_by(Message.id).limit(limit + 1)
+            )).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        message_list = []
+        for msg, sender_nickname in rows:
+            message_list.append(MessageInfo(
+                id=msg.id,
+                chat_room_id=msg.chat_room_id,
+                sender_id=msg.sender_id,
+                sender_nickname=sender_nickname,
+                message_text=msg.message_text,
+                message_type=msg.message_type,
+                is_read=msg.is_read,
+                created_at=msg.created_at,
+                is_mine=(msg.sender_id == current_user.id)
+            ))
+        
+        # 全件を返せない場合はETagを付けない（続きを取得させる）
+        if not has_more:
+            response.headers["ETag"] = etag
+        
+        return MessageSyncResponse(
+            messages=message_list,
+            high_water_mark=message_list[-1].id if message_list else since_id,
+            has_more=has_more,
+            my_last_read_message_id=my_last_read,
+            partner_last_read_message_id=partner_last_read
+        )
+        
+    except Exception as e:
+        print(f"メッセージ差分同期エラー: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"メッセージの同期に失敗しました: {str(e)}"
+        )
+
 @router.post("/rooms/{room_id}/messages", response_model=MessageInfo)
 async def send_message(
     room_id: int,
     request: MessageCreate,
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     メッセージを送信
@@ -259,56 +427,33 @@ async def send_message(
         MessageInfo: 送信されたメッセージ情報
     """
     try:
-        # チャットルームが存在し、自分が参加者かチェック
-        chat_room = db.query(ChatRoom).filter(
-            and_(
-                ChatRoom.id == room_id,
-                or_(
-                    ChatRoom.user1_id == current_user.id,
-                    ChatRoom.user2_id == current_user.id
-                )
+        if MessageWriterConfig.GROUP_COMMIT_ENABLED:
+            # 認証で使用した接続を返却し、他の送信とまとめてコミットする
+            await db.rollback()
+            sent = await MessageGroupCommitter.submit(
+                room_id, current_user, request.message_text, request.message_type
             )
-        ).first()
+        else:
+            # 参加者チェック・INSERT・チャットルーム更新を1文で実行
+            sent = await write_message(
+                db, room_id, current_user, request.message_text, request.message_type
+            )
+            if sent is not None:
+                await db.commit()
+                sent.after_commit()
         
-        if not chat_room:
+        if sent is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="チャットルームが見つからないか、アクセス権限がありません"
             )
         
-        # メッセージを作成
-        new_message = Message(
-            chat_room_id=room_id,
-            sender_id=current_user.id,
-            message_text=request.message_text,
-            message_type=request.message_type
-        )
-        
-        db.add(new_message)
-        
-        # チャットルームの更新日時を更新
-        chat_room.updated_at = func.now()
-        
-        db.commit()
-        db.refresh(new_message)
-        
-        # 送信者の情報を取得
-        sender = db.query(User).filter(User.id == current_user.id).first()
-        
-        return MessageInfo(
-            id=new_message.id,
-            chat_room_id=new_message.chat_room_id,
-            sender_id=new_message.sender_id,
-            sender_nickname=sender.nick_name,
-            message_text=new_message.message_text,
-            message_type=new_message.message_type,
-            is_read=new_message.is_read,
-            created_at=new_message.created_at,
-            is_mine=True
-        )
+        return sent.message
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"メッセージ送信エラー: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -319,7 +464,7 @@ async def send_message(
 async def mark_message_as_read(
     message_id: int,
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     メッセージを既読にする
@@ -334,7 +479,10 @@ async def mark_message_as_read(
     """
     try:
         # メッセージが存在し、自分宛てかチェック
-        message = db.query(Message).filter(Message.id == message_id).first()
+        result = await db.execute(
+            select(Message).where(Message.id == message_id)
+        )
+        message = result.scalars().first()
         
         if not message:
             raise HTTPException(
@@ -343,15 +491,18 @@ async def mark_message_as_read(
             )
         
         # チャットルームの参加者かチェック
-        chat_room = db.query(ChatRoom).filter(
-            and_(
-                ChatRoom.id == message.chat_room_id,
-                or_(
-                    ChatRoom.user1_id == current_user.id,
-                    ChatRoom.user2_id == current_user.id
+        result = await db.execute(
+            select(ChatRoom).where(
+                and_(
+                    ChatRoom.id == message.chat_room_id,
+                    or_(
+                        ChatRoom.user1_id == current_user.id,
+                        ChatRoom.user2_id == current_user.id
+                    )
                 )
             )
-        ).first()
+        )
+        chat_room = result.scalars().first()
         
         if not chat_room:
             raise HTTPException(
@@ -361,15 +512,335 @@ async def mark_message_as_read(
         
         # 自分のメッセージでない場合のみ既読にする
         if message.sender_id != current_user.id:
-            message.is_read = True
-            db.commit()
+            updated = await db.execute(
+                update(Message).where(
+                    and_(Message.id == message_id, Message.is_read == False)
+                ).values(is_read=True)
+            )
+            # 未読から既読になった場合のみ自分の未読数を減らし、送信者へ通知する
+            notified = False
+            event = {
+                "type": "read",
+                "chat_room_id": message.chat_room_id,
+                "reader_id": current_user.id,
+                "message_ids": [message_id]
+            }
+            if updated.rowcount:
+                if chat_room.user1_id == current_user.id:
+                    chat_room.user1_unread_count = func.greatest(ChatRoom.user1_unread_count - 1, 0)
+                    chat_room.user1_last_read_message_id = func.greatest(ChatRoom.user1_last_read_message_id, message_id)
+                else:
+                    chat_room.user2_unread_count = func.greatest(ChatRoom.user2_unread_count - 1, 0)
+                    chat_room.user2_last_read_message_id = func.greatest(ChatRoom.user2_last_read_message_id, message_id)
+                notified = await ChatHub.notify(db, [message.sender_id], event)
+            await db.commit()
+            if updated.rowcount and not notified:
+                ChatHub.publish_local([message.sender_id], event)
         
         return {"message": "メッセージを既読にしました"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"既読更新エラー: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"既読の更新に失敗しました: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.put("/rooms/{room_id}/read", response_model=MarkReadResponse)
+async def mark_messages_as_read(
+    room_id: int,
+    request: MarkReadRequest,
+    current_user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    指定したメッセージID以下の相手のメッセージをまとめて既読にする
+    
+    メッセージ数に関わらず、既読更新は1回のUPDATEで行い、未読数・既読位置も同一トランザクションで更新する
+    
+    Args:
+        room_id: チャットルームID
+        request: まとめて既読リクエスト
+        current_user: ログイン中のユーザー情報
+        db: データベースセッション
+    
+    Returns:
+        MarkReadResponse: 処理結果
+    """
+    try:
+        # チャットルームが存在し、自分が参加者かチェック
+        result = await db.execute(
+            select(ChatRoom).where(
+                and_(
+                    ChatRoom.id == room_id,
+                    or_(
+                        ChatRoom.user1_id == current_user.id,
+                        ChatRoom.user2_id == current_user.id
+                    )
+                )
+            )
+        )
+        chat_room = result.scalars().first()
+        
+        if not chat_room:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="チャットルームが見つからないか、アクセス権限がありません"
+            )
+        
+        # 相手の未読メッセージをまとめて既読にする
+        updated = await db.execute(
+            update(Message).where(
+                and_(
+                    Message.chat_room_id == room_id,
+                    Message.sender_id != current_user.id,
+                    Message.is_read == False,
+                    Message.id <= request.up_to_message_id
+                )
+            ).values(is_read=True).returning(Message.id).execution_options(synchronize_session=False)
+        )
+        updated_count = len(updated.all())
+        
+        # 未読数・既読位置を更新
+        if chat_room.user1_id == current_user.id:
+            unread_column, last_read_column = ChatRoom.user1_unread_count, ChatRoom.user1_last_read_message_id
+        else:
+            unread_column, last_read_column = ChatRoom.user2_unread_count, ChatRoom.user2_last_read_message_id
+        result = await db.execute(
+            update(ChatRoom).where(
+                ChatRoom.id == room_id
+            ).values({
+                unread_column: func.greatest(unread_column - updated_count, 0),
+                # 既読位置はルームの最新メッセージを超えない（未送信のメッセージを先に既読にしない）
+                last_read_column: func.greatest(
+                    last_read_column,
+                    func.least(request.up_to_message_id, func.coalesce(ChatRoom.last_message_id, 0))
+                )
+            }).returning(last_read_column).execution_options(synchronize_session=False)
+        )
+        last_read_message_id = result.scalar_one()
+        
+        # 相手へ既読を通知
+        notified = False
+        partner_id = chat_room.get_partner_id(current_user.id)
+        event = {
+            "type": "read",
+            "chat_room_id": room_id,
+            "reader_id": current_user.id,
+            "up_to_message_id": last_read_message_id
+        }
+        if updated_count:
+            notified = await ChatHub.notify(db, [partner_id], event)
+        
+        await db.commit()
+        if updated_count and not notified:
+            ChatHub.publish_local([partner_id], event)
+        
+        return MarkReadResponse(
+            updated_count=updated_count,
+            last_read_message_id=last_read_message_id
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"既読更新エラー: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"既読の更新に失敗しました: {str(e)}"
+        )
+
+@router.get("/unread_count", response_model=UnreadCountResponse)
+async def get_unread_count(
+    current_user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    全チャットルームの未読メッセージ数の合計を取得
+    
+    Args:
+        current_user: ログイン中のユーザー情報
+        db: データベースセッション
+    
+    Returns:
+        UnreadCountResponse: 未読メッセージ数の合計
+    """
+    try:
+        # 未読のあるルームの部分インデックスのみを参照する
+        user1_unread = select(ChatRoom.user1_unread_count.label('unread_count')).where(
+            and_(ChatRoom.user1_id == current_user.id, ChatRoom.user1_unread_count > 0)
+        )
+        user2_unread = select(ChatRoom.user2_unread_count.label('unread_count')).where(
+            and_(ChatRoom.user2_id == current_user.id, ChatRoom.user2_unread_count > 0)
+        )
+        unread = user1_unread.union_all(user2_unread).subquery('unread')
+        total = await db.scalar(
+            select(func.coalesce(func.sum(unread.c.unread_count), 0))
+        )
+        
+        return UnreadCountResponse(unread_count=total)
+        
+    except Exception as e:
+        print(f"未読数取得エラー: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"未読数の取得に失敗しました: {str(e)}"
+        )
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=100, description="検索キーワード（部分一致）"),
+    room_id: Optional[int] = Query(None, description="検索するチャットルームID（未指定時は全ルーム）"),
+    before: Optional[str] = Query(None, description="このカーソルより古いメッセージを検索"),
+    limit: int = Query(20, ge=1, le=50, description="1ページあたりの件数"),
+    current_user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    参加しているチャットルームのメッセージを検索
+    
+    本文の部分一致はトライグラムインデックス（idx_messages_text_trgm）で絞り込み、
+    (created_at, id) のカーソルで新しい順にページングする
+    
+    Args:
+        q: 検索キーワード
+        room_id: 検索するチャットルームID
+        before: このカーソルより古いメッセージを検索（前ページのnext_cursor）
+        limit: 1ページあたりの件数
+        current_user: ログイン中のユーザー情報
+        db: データベースセッション
+    
+    Returns:
+        MessageSearchResponse: 検索結果（新しい順、一致箇所の抜粋付き）
+    """
+    try:
+        keyword = q.strip()
+        if not keyword:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="検索キーワードを指定してください"
+            )
+        try:
+            before_key = decode_cursor(before)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        # 自分が参加しているルームのメッセージのみを対象にする
+        query = select(
+            Message,
+            User.nick_name
+        ).join(
+            ChatRoom, ChatRoom.id == Message.chat_room_id
+        ).join(
+            User, User.id == Message.sender_id
+        ).where(
+            and_(
+                or_(
+                    ChatRoom.user1_id == current_user.id,
+                    ChatRoom.user2_id == current_user.id
+                ),
+                Message.message_text.ilike(f"%{escape_like(keyword)}%", escape='\\')
+            )
+        )
+        if room_id is not None:
+            query = query.where(Message.chat_room_id == room_id)
+        if before_key is not None:
+            query = query.where(tuple_(Message.created_at, Message.id) < tuple_(*before_key))
+        query = query.order_by(desc(Message.created_at), desc(Message.id)).limit(limit + 1)
+        
+        rows = (await db.execute(query)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        # 一致箇所の抜粋を作成
+        results = []
+        for msg, sender_nickname in rows:
+            snippet, highlights = build_snippet(msg.message_text, keyword)
+            results.append(MessageSearchHit(
+                message=MessageInfo(
+                    id=msg.id,
+                    chat_room_id=msg.chat_room_id,
+                    sender_id=msg.sender_id,
+                    sender_nickname=sender_nickname,
+                    message_text=msg.message_text,
+                    message_type=msg.message_type,
+                    is_read=msg.is_read,
+                    created_at=msg.created_at,
+                    is_mine=(msg.sender_id == current_user.id)
+                ),
+                snippet=snippet,
+                highlights=highlights
+            ))
+        
+        last = results[-1].message if results else None
+        return MessageSearchResponse(
+            results=results,
+            next_cursor=encode_cursor(last.created_at, last.id) if last else None,
+            has_more=has_more
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"メッセージ検索エラー: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"メッセージの検索に失敗しました: {str(e)}"
+        )
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    token: str = Query(..., description="JWTトークン")
+):
+    """
+    チャットイベントをリアルタイムに受信するWebSocket
+    
+    新着メッセージ（type=message）と既読（type=read）をJSONでプッシュする。
+    クライアントはメッセージ一覧のポーリングの代わりにこの接続を使用する
+    
+    Args:
+        websocket: WebSocket接続
+        token: JWTトークン（ブラウザからはヘッダーを付与できないためクエリで受け取る）
+    """
+    # 認証（接続中はDB接続を保持しない）
+    try:
+        async with AsyncSessionLocal() as db:
+            current_user = await get_current_user(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    queue = ChatHub.subscribe(current_user.id)
+    
+    async def forward_events():
+        """購読したイベントをクライアントへ送信"""
+        while True:
+            event = await queue.get()
+            await websocket.send_json(event)
+    
+    async def receive_until_closed():
+        """クライアントからの切断を検知（受信内容はキープアライブとして破棄）"""
+        while True:
+            await websocket.receive_text()
+    
+    tasks = [
+        asyncio.create_task(forward_events()),
+        asyncio.create_task(receive_until_closed())
+    ]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exception = task.exception()
+            if exception is not None and not isinstance(exception, WebSocketDisconnect):
+                print(f"チャットWebSocketエラー: {exception}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        ChatHub.unsubscribe(current_user.id, queue)
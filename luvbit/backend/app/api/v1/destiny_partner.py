@@ -1,34 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 import random
-import base64
 
-from core.db import get_db
+from core.db import get_async_db
 from core.security import get_current_user
 from models.user import User
 from models.user_position import UserPosition
 from schemas.destiny_partner import DestinyPartnerResponse
 from schemas.auth import UserInfo
-from services.satellite_service import SatelliteService
+from services.satellite_service import SatelliteService, TemporalMatchConfig
+from services.position_history_service import PositionHistoryService
+from services.destiny_cache import DestinyPartnerCache
+from services.profile_image_service import ProfileImageService
 
 router = APIRouter()
 
 @router.get("/debug/user_positions")
 async def debug_user_positions(
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """デバッグ用: 全ユーザーの位置情報を表示"""
     try:
-        user_positions = db.query(
-            UserPosition.user_id,
-            UserPosition.lat,
-            UserPosition.lng,
-            User.nick_name
-        ).join(
-            User, UserPosition.user_id == User.id
-        ).all()
+        result = await db.execute(
+            select(
+                UserPosition.user_id,
+                UserPosition.lat,
+                UserPosition.lng,
+                User.nick_name
+            ).join(
+                User, UserPosition.user_id == User.id
+            )
+        )
+        user_positions = result.all()
         
         result = []
         for pos in user_positions:
@@ -72,14 +79,21 @@ async def debug_satellite_track(
 @router.get("/get_destiny_partner", response_model=DestinyPartnerResponse)
 async def get_destiny_partner(
     satellite_name: str = Query(..., description="衛星名"),
+    passed_within_hours: Optional[int] = Query(
+        None, ge=1, le=24, description="指定した場合、直近この時間内に衛星が真上を通過した時刻に、その場所にいたユーザーから探す"
+    ),
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     運命のパートナーを見つける
     
+    passed_within_hoursを指定した場合は、時刻付きの軌道と位置履歴を突き合わせ、
+    衛星が通過した時刻の前後にその真下付近にいたユーザーを候補にする
+    
     Args:
         satellite_name: 衛星名
+        passed_within_hours: 通過時刻を考慮する時間（時間）
         current_user: ログイン中のユーザー情報
         db: データベースセッション
     
@@ -92,94 +106,143 @@ async def get_destiny_partner(
     try:
         print(f"運命のパートナー検索開始: 衛星={satellite_name}, ユーザー={current_user.id}")
         
-        # 1. 衛星の軌道を計算
-        print("衛星軌道を計算中...")
-        ground_track = SatelliteService.calculate_satellite_ground_track(satellite_name, hours=24)
-        
-        if not ground_track:
-            return DestinyPartnerResponse(
-                message=f"衛星 '{satellite_name}' の軌道データが見つかりません"
+        # 1. 候補集合は検索するユーザーに依らないため、衛星と時間帯でキャッシュを共有する
+        cache_key = DestinyPartnerCache.make_key(satellite_name, window_hours=passed_within_hours or 0)
+        
+        candidate_ids = DestinyPartnerCache.get(cache_key)
+        if candidate_ids is not None:
+            print(f"キャッシュされた候補を使用: {len(candidate_ids)}人")
+        elif passed_within_hours:
+            # 2. 時刻付きの衛星軌道を計算
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            start = now - timedelta(hours=passed_within_hours)
+            timed_track = SatelliteService.calculate_timed_ground_track(satellite_name, start, now)
+            ground_track = [(lat, lng) for _, lat, lng in timed_track]
+            print(f"軌道ポイント数: {len(timed_track)}")
+            
+            # 3. 軌道近くのセルにいたユーザーの位置履歴を時刻順に取得
+            tolerance_km = 1.0  # 1km以内
+            time_tolerance = timedelta(minutes=TemporalMatchConfig.TIME_TOLERANCE_MINUTES)
+            fixes = await PositionHistoryService.find_in_window(
+                db, start - time_tolerance, now, points=ground_track, radius_km=tolerance_km
             )
-        
-        print(f"軌道ポイント数: {len(ground_track)}")
-        
-        # 2. 自分以外のユーザーの位置情報を取得
-        user_positions_query = db.query(
-            UserPosition.user_id,
-            UserPosition.lat,
-            UserPosition.lng,
-            User.nick_name,
-            User.profile_image,
-            User.age,
-            User.sex,
-            User.constellation
-        ).join(
-            User, UserPosition.user_id == User.id
-        ).filter(
-            UserPosition.user_id != current_user.id  # 自分以外
-        )
-        
-        user_positions = user_positions_query.all()
-        print(f"検索対象ユーザー数: {len(user_positions)}")
-        
-        if not user_positions:
-            return DestinyPartnerResponse(
-                message="他のユーザーが見つかりません"
+            print(f"検索対象の位置履歴: {len(fixes)}件")
+            
+            # 4. 通過時刻の前後に軌道の真下付近にいたユーザーを検索
+            matched = SatelliteService.find_users_under_timed_track(
+                timed_track=timed_track,
+                fixes=fixes,
+                tolerance_km=tolerance_km,
+                time_tolerance=time_tolerance
             )
-        
-        # 3. 位置情報をリスト形式に変換
-        user_position_list = []
-        for pos in user_positions:
-            user_position_list.append({
-                'user_id': pos.user_id,
-                'lat': pos.lat,
-                'lng': pos.lng,
-                'nickname': pos.nick_name,
-                'profile_image': pos.profile_image,
-                'age': pos.age,
-                'sex': pos.sex,
-                'constellation': pos.constellation
-            })
-        
-        # 4. 衛星軌道近くにいるユーザーを検索
-        print("軌道近くのユーザーを検索中...")
-        matched_users = SatelliteService.find_users_near_ground_track(
-            ground_track=ground_track,
-            user_positions=user_position_list,
-            tolerance_km=1.0  # 1km以内
-        )
-        
-        print(f"マッチしたユーザー数: {len(matched_users)}")
-        
-        if not matched_users:
+            
+            candidate_ids = frozenset(matched)
+            DestinyPartnerCache.put(cache_key, candidate_ids, ground_track, tolerance_km)
+        else:
+            # 2. 衛星の軌道を計算
+            print("衛星軌道を計算中...")
+            ground_track = SatelliteService.calculate_satellite_ground_track(satellite_name, hours=24)
+            
+            if not ground_track:
+                return DestinyPartnerResponse(
+                    message=f"衛星 '{satellite_name}' の軌道データが見つかりません"
+                )
+            
+            print(f"軌道ポイント数: {len(ground_track)}")
+            
+            # 3. ユーザーの位置情報を取得（候補集合は他のユーザーと共有するため自分も含める）
+            result = await db.execute(
+                select(
+                    UserPosition.user_id,
+                    UserPosition.lat,
+                    UserPosition.lng
+                ).order_by(UserPosition.user_id)
+            )
+            user_positions = result.all()
+            print(f"検索対象ユーザー数: {len(user_positions)}")
+            
+            if not any(pos.user_id != current_user.id for pos in user_positions):
+                return DestinyPartnerResponse(
+                    message="他のユーザーが見つかりません"
+                )
+            
+            user_position_list = [
+                {'user_id': pos.user_id, 'lat': pos.lat, 'lng': pos.lng}
+                for pos in user_positions
+            ]
+            
+            # 4. 衛星軌道近くにいるユーザーを検索
+            print("軌道近くのユーザーを検索中...")
+            tolerance_km = 1.0  # 1km以内
+            matched_users = SatelliteService.find_users_near_ground_track(
+                ground_track=ground_track,
+                user_positions=user_position_list,
+                tolerance_km=tolerance_km
+            )
+            
+            candidate_ids = frozenset(user['user_id'] for user in matched_users)
+            DestinyPartnerCache.put(cache_key, candidate_ids, ground_track, tolerance_km)
+        
+        candidates = sorted(candidate_ids - {current_user.id})
+        print(f"マッチしたユーザー数: {len(candidates)}")
+        
+        if not candidates and not passed_within_hours:
+            # 軌道近くに他のユーザーがいない場合はユーザーIDが最も小さい他のユーザーを候補にする
+            # （候補集合は他のユーザーと共有するため、自分を除いた補完は検索ごとに行う）
+            result = await db.execute(
+                select(UserPosition.user_id).where(
+                    UserPosition.user_id != current_user.id
+                ).order_by(UserPosition.user_id).limit(1)
+            )
+            fallback_id = result.scalar()
+            if fallback_id is None:
+                return DestinyPartnerResponse(
+                    message="他のユーザーが見つかりません"
+                )
+            candidates = [fallback_id]
+        
+        if not candidates:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"'{satellite_name}'はあなたと運命の出会いをもたらしませんでした"
             )
         
         # 5. ランダムに1ユーザーを選択
-        selected_user = random.choice(matched_users)
+        result = await db.execute(
+            select(
+                User.id,
+                User.nick_name,
+                User.profile_image_hash,
+                User.age,
+                User.sex,
+                User.constellation
+            ).where(
+                User.id == random.choice(candidates)
+            )
+        )
+        selected_user = result.first()
         
-        print(f"選択されたパートナー: user_id={selected_user['user_id']}, nickname={selected_user['nickname']}")
+        if not selected_user:
+            DestinyPartnerCache.clear()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"'{satellite_name}'はあなたと運命の出会いをもたらしませんでした"
+            )
         
-        # profile_imageをBase64エンコード
-        profile_image_base64 = None
-        if selected_user.get('profile_image'):
-            try:
-                profile_image_base64 = base64.b64encode(selected_user['profile_image']).decode('utf-8')
-            except Exception as e:
-                print(f"Profile image encoding error: {e}")
+        print(f"選択されたパートナー: user_id={selected_user.id}, nickname={selected_user.nick_name}")
         
         return DestinyPartnerResponse(
-            user_id=selected_user['user_id'],
-            nickname=selected_user['nickname'],
-            profile_image=profile_image_base64,
-            age=selected_user['age'],
-            sex=selected_user['sex'],
-            constellation=selected_user['constellation'],
+            user_id=selected_user.id,
+            nickname=selected_user.nick_name,
+            profile_image_url=ProfileImageService.url_for(selected_user.id, selected_user.profile_image_hash, 256, 'webp'),
+            age=selected_user.age,
+            sex=selected_user.sex,
+            constellation=selected_user.constellation,
             message=f"'{satellite_name}' の軌道が運命の出会いをもたらしました！"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"運命のパートナー検索エラー: {e}")
         raise HTTPException(
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+
+from core.metrics import Metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    プロセス内メトリクスを取得する
+    
+    Returns:
+        dict: メトリクス名と値のマッピング（DBコネクションプールの貸出状況など）
+    """
+    return Metrics.snapshot()
@@ -3,8 +3,9 @@ from core.security import get_current_user
 from schemas.auth import UserInfo
 from services.satellite_service import SatelliteService
 from typing import List, Dict
-from sqlalchemy.orm import Session
-from core.db import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.db import get_async_db
 from models.user_position import UserPosition
 
 router = APIRouter()
@@ -34,7 +35,7 @@ async def get_satellite_count():
 @router.get("/satellites/nearby")
 async def get_nearby_satellites(
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ユーザーの現在位置から1km以内を通る衛星を取得
@@ -48,9 +49,12 @@ async def get_nearby_satellites(
     """
     try:
         # ユーザーの最新位置を取得
-        user_position = db.query(UserPosition).filter(
-            UserPosition.user_id == current_user.id
-        ).order_by(UserPosition.created_at.desc()).first()
+        result = await db.execute(
+            select(UserPosition).where(
+                UserPosition.user_id == current_user.id
+            ).order_by(UserPosition.created_at.desc())
+        )
+        user_position = result.scalars().first()
         
         if not user_position:
             raise HTTPException(
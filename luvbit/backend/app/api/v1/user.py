@@ -1,19 +1,25 @@
 import uuid
-import base64
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from core.db import get_db
-from core.security import get_password_hash, get_current_user
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.db import get_async_db
+from core.security import get_password_hash_async, get_current_user
+from core.user_cache import UserInfoCache
 from models.user import User
-from schemas.user import UserCreate, UserResponse
+from schemas.user import UserCreate, UserResponse, ProfileImageResponse
 from schemas.auth import UserInfo
+from services.blob_store import BlobStore
+from services.profile_image_service import ProfileImageConfig, ProfileImageService
+from services.profile_image_upload import ProfileImageUploadService
 
 router = APIRouter()
 
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ユーザーを作成する
@@ -27,9 +33,10 @@ async def create_user(
     """
     try:
         # 既存ユーザーの重複チェック
-        existing_user = db.query(User).filter(
-            User.email == user_data.email
-        ).first()
+        result = await db.execute(
+            select(User.id).where(User.email == user_data.email)
+        )
+        existing_user = result.first()
         
         if existing_user:
             raise HTTPException(
@@ -38,7 +45,7 @@ async def create_user(
             )
 
         # パスワードをハッシュ化
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
 
         # 新しいユーザーを作成
         db_user = User(
@@ -50,8 +57,7 @@ async def create_user(
 
         # DBに追加してコミット
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
 
         # レスポンスを作成
         return UserResponse(
@@ -61,21 +67,19 @@ async def create_user(
         )
 
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
         )
-    finally:
-        db.close()
 
 @router.get("/user_info")
 async def get_user_info(
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ログイン中のユーザー情報を取得する
@@ -85,11 +89,14 @@ async def get_user_info(
         db: DBセッション
     
     Returns:
-        dict: ユーザー情報（プロフィール画像を含む）
+        dict: ユーザー情報（プロフィール画像はURL）
     """
     try:
         # ユーザー情報を取得
-        user = db.query(User).filter(User.id == current_user.id).first()
+        result = await db.execute(
+            select(User).where(User.id == current_user.id)
+        )
+        user = result.scalars().first()
         
         if not user:
             raise HTTPException(
@@ -97,28 +104,147 @@ async def get_user_info(
                 detail="ユーザーが見つかりません"
             )
         
-        # プロフィール画像をBase64エンコード
-        profile_image_base64 = None
-        if user.profile_image:
-            try:
-                profile_image_base64 = base64.b64encode(user.profile_image).decode('utf-8')
-            except Exception as e:
-                print(f"Profile image encoding error: {e}")
-        
         return {
             "id": user.id,
             "uuid": user.uuid,
             "email": user.email,
             "nick_name": user.nick_name,
-            "profile_image": profile_image_base64,
+            "profile_image_url": ProfileImageService.url_for(user.id, user.profile_image_hash),
+            "profile_image_thumbnail_url": ProfileImageService.url_for(
+                user.id, user.profile_image_hash, ProfileImageConfig.THUMBNAIL_SIZE, 'webp'
+            ),
             "age": user.age,
             "sex": user.sex,
             "constellation": user.constellation,
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ユーザー情報取得エラー: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"ユーザー情報の取得に失敗しました: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.put("/users/me/image", response_model=ProfileImageResponse)
+async def upload_profile_image(
+    request: Request,
+    current_user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    プロフィール画像をアップロードする
+    
+    multipart/form-dataの file 項目で画像（JPEG/PNG/WebP/GIF）を送信する。
+    本文はストリーミングで受信してブロブストアへ保存し、縮小版も作成する
+    
+    Args:
+        request: リクエスト
+        current_user: ログイン中のユーザー情報
+        db: DBセッション
+    
+    Returns:
+        ProfileImageResponse: 新しいプロフィール画像のURL
+    """
+    # 認証で使用した接続を受信中に保持しないよう解放
+    await db.rollback()
+    image_hash = await ProfileImageUploadService.receive(request)
+    renditions = await ProfileImageUploadService.render_all(image_hash)
+    
+    try:
+        await db.execute(
+            update(User).where(User.id == current_user.id).values(profile_image_hash=image_hash)
+        )
+        await db.execute(ProfileImageService.save_renditions_statement(image_hash, renditions))
+        await db.commit()
+        # Coreでの更新はORMのイベントが発火しないため明示的に無効化
+        UserInfoCache.invalidate(current_user.id)
+    except Exception as e:
+        await db.rollback()
+        print(f"プロフィール画像更新エラー: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"プロフィール画像の更新に失敗しました: {str(e)}"
+        )
+    
+    return ProfileImageResponse(
+        profile_image_url=ProfileImageService.url_for(current_user.id, image_hash),
+        profile_image_thumbnail_url=ProfileImageService.url_for(
+            current_user.id, image_hash, ProfileImageConfig.THUMBNAIL_SIZE, 'webp'
+        )
+    )
+
+@router.get("/users/{user_id}/image")
+async def get_profile_image(
+    user_id: int,
+    v: str = Query(..., description="画像のバージョン（プロフィール画像URLに含まれる値）"),
+    size: int = Query(0, ge=0, description="長辺のピクセル数（0は元のサイズ）"),
+    format: str = Query('original', pattern='^(original|webp)$', description="画像形式"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    プロフィール画像を取得する
+    
+    バージョン付きURL（JSONのprofile_image_url）でのみ取得でき、長期間キャッシュできる
+    画像はブロブストアのファイルをそのまま返す（メモリに読み込まない）
+    
+    Args:
+        user_id: ユーザーID
+        v: 画像のバージョン
+        size: 縮小版の長辺のピクセル数（PROFILE_IMAGE_SIZESのいずれか、0は元のサイズ）
+        format: 'original'（元の形式）または 'webp'
+        if_none_match: クライアントがキャッシュしている画像のETag
+        db: DBセッション
+    
+    Returns:
+        FileResponse: 画像ファイル（ETagが一致する場合は304）
+    """
+    if size and size not in ProfileImageConfig.SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sizeは{', '.join(str(s) for s in ProfileImageConfig.SIZES)}のいずれかを指定してください"
+        )
+    
+    image_hash = await db.scalar(
+        select(User.profile_image_hash).where(User.id == user_id)
+    )
+    if not image_hash or v != ProfileImageService.version_of(image_hash):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="プロフィール画像が見つかりません"
+        )
+    
+    etag = ProfileImageService.etag_of(image_hash, size, format)
+    headers = {"ETag": etag, "Cache-Control": ProfileImageConfig.CACHE_CONTROL}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if size or format != 'original':
+        # 縮小版・変換版
+        rendition = await ProfileImageService.get_rendition(db, image_hash, size, format)
+        if rendition is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="プロフィール画像が見つかりません"
+            )
+        return FileResponse(
+            BlobStore.path_for(rendition.blob_hash),
+            media_type=rendition.content_type,
+            headers=headers
+        )
+    
+    try:
+        media_type = ProfileImageService.media_type_of(BlobStore.read_head(image_hash))
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="プロフィール画像が見つかりません"
+        )
+    
+    return FileResponse(
+        BlobStore.path_for(image_hash),
+        media_type=media_type,
+        headers=headers
+    )
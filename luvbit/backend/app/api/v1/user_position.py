@@ -1,12 +1,19 @@
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.db import get_db
+from core.db import get_async_db
 from core.security import get_current_user
-from models.user_position import UserPosition
-from schemas.user_position import UserPositionRequest, UserPositionResponse
+from schemas.user_position import (
+    UserPositionRequest, UserPositionResponse,
+    UserPositionBatchRequest, UserPositionBatchResponse
+)
 from schemas.auth import UserInfo
+from services.destiny_cache import DestinyPartnerCache
+from services.position_buffer import PositionBufferConfig, PositionWriteBuffer
+from services.position_filter import PositionMovementFilter
+from services.position_history_service import PositionHistoryService
+from services.user_position_service import UserPositionService
 
 router = APIRouter()
 
@@ -14,11 +21,15 @@ router = APIRouter()
 async def regist_user_position(
     position_data: UserPositionRequest,
     current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ユーザーの位置情報を登録・更新する
     
+    ライトビハインドが有効な場合はバッファに追加して一定間隔でまとめて書き込む。
+    無効な場合は INSERT ... ON CONFLICT (user_id) DO UPDATE ... RETURNING の1文で登録・更新する。
+    書き込んだ位置は位置履歴にも追記する
+    
     Args:
         position_data: 位置情報データ（緯度・経度）
         current_user: ログイン中のユーザー情報
@@ -30,47 +41,114 @@ async def regist_user_position(
     Raises:
         HTTPException: データベースエラーが発生した場合
     """
+    # 前回から移動していなければ書き込まない
+    if not PositionMovementFilter.accept(current_user.id, position_data.lat, position_data.lng):
+        return UserPositionResponse(
+            user_id=current_user.id,
+            lat=position_data.lat,
+            lng=position_data.lng
+        )
+    
+    recorded_at = datetime.now(timezone.utc)
+    history = [(current_user.id, position_data.lat, position_data.lng, recorded_at)]
+    
+    if PositionBufferConfig.WRITE_BEHIND_ENABLED:
+        PositionWriteBuffer.offer(current_user.id, position_data.lat, position_data.lng, recorded_at)
+        PositionWriteBuffer.offer_history(history)
+        return UserPositionResponse(
+            user_id=current_user.id,
+            lat=position_data.lat,
+            lng=position_data.lng
+        )
+    
     try:
-        # 既存の位置情報を検索
-        existing_position = db.query(UserPosition).filter(
-            UserPosition.user_id == current_user.id
-        ).first()
+        result = await UserPositionService.upsert(
+            db, current_user.id, position_data.lat, position_data.lng
+        )
+        await PositionHistoryService.append(db, history)
+        await db.commit()
         
-        if existing_position:
-            # 既存データの更新
-            existing_position.lat = position_data.lat
-            existing_position.lng = position_data.lng
-            existing_position.updated_at = datetime.utcnow()
-            
-            db.commit()
-            db.refresh(existing_position)
-            
-            return UserPositionResponse(
-                user_id=existing_position.user_id,
-                lat=existing_position.lat,
-                lng=existing_position.lng
-            )
+        # 移動前後のセルに依存する運命のパートナー検索キャッシュを無効化
+        if result.previous is not None:
+            DestinyPartnerCache.invalidate_positions(result.previous, (result.lat, result.lng))
         else:
-            # 新規データの作成
-            new_position = UserPosition(
-                user_id=current_user.id,
-                lat=position_data.lat,
-                lng=position_data.lng
-            )
-            
-            db.add(new_position)
-            db.commit()
-            db.refresh(new_position)
-            
-            return UserPositionResponse(
-                user_id=new_position.user_id,
-                lat=new_position.lat,
-                lng=new_position.lng
-            )
+            DestinyPartnerCache.invalidate_positions((result.lat, result.lng))
+        
+        return UserPositionResponse(
+            user_id=result.user_id,
+            lat=result.lat,
+            lng=result.lng
+        )
             
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        PositionMovementFilter.forget(current_user.id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"位置情報の登録に失敗しました: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/regist_user_positions", response_model=UserPositionBatchResponse)
+async def regist_user_positions(
+    batch: UserPositionBatchRequest,
+    current_user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    端末に溜まった複数の測位結果をまとめて登録する
+    
+    現在位置として保持するのは測位時刻が最新のもののみ（移動していなければ更新しない）。
+    位置履歴には移動の有無に関わらず全ての測位結果を追記する
+    
+    Args:
+        batch: 測位結果のリスト
+        current_user: ログイン中のユーザー情報
+        db: データベースセッション
+    
+    Returns:
+        UserPositionBatchResponse: 受け付けた件数と採用した位置
+    """
+    # 測位時刻のタイムゾーンが無い場合はUTCとみなす
+    fixes = [
+        fix.model_copy(update={'recorded_at': fix.recorded_at.replace(tzinfo=timezone.utc)})
+        if fix.recorded_at.tzinfo is None else fix
+        for fix in batch.fixes
+    ]
+    latest = max(fixes, key=lambda fix: fix.recorded_at)
+    
+    # 前回から移動していなければ現在位置は書き込まない（位置履歴は常に追記する）
+    should_write = PositionMovementFilter.accept(current_user.id, latest.lat, latest.lng)
+    
+    history = [(current_user.id, fix.lat, fix.lng, fix.recorded_at) for fix in fixes]
+    
+    if PositionBufferConfig.WRITE_BEHIND_ENABLED:
+        if should_write:
+            PositionWriteBuffer.offer(current_user.id, latest.lat, latest.lng, latest.recorded_at)
+        PositionWriteBuffer.offer_history(history)
+    else:
+        try:
+            result = None
+            if should_write:
+                result = await UserPositionService.upsert(db, current_user.id, latest.lat, latest.lng)
+            await PositionHistoryService.append(db, history)
+            await db.commit()
+            if result is not None and result.previous is not None:
+                DestinyPartnerCache.invalidate_positions(result.previous, (result.lat, result.lng))
+            elif result is not None:
+                DestinyPartnerCache.invalidate_positions((result.lat, result.lng))
+        except Exception as e:
+            await db.rollback()
+            if should_write:
+                PositionMovementFilter.forget(current_user.id)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"位置情報の登録に失敗しました: {str(e)}"
+            )
+    
+    return UserPositionBatchResponse(
+        user_id=current_user.id,
+        accepted_count=len(fixes),
+        lat=latest.lat,
+        lng=latest.lng,
+        recorded_at=latest.recorded_at
+    )
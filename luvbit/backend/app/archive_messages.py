@@ -0,0 +1,13 @@
+from services.message_partition_service import MessagePartitionService
+
+# 定期実行（cron等）を想定したメッセージパーティションのメンテナンス
+# 1. 今後数ヶ月分のパーティションを作成
+# 2. 保持期間を過ぎたパーティションをアーカイブして削除
+
+if __name__ == "__main__":
+    try:
+        MessagePartitionService.ensure_partitions()
+        archived = MessagePartitionService.archive_old_partitions()
+        print(f"✅ アーカイブ完了: {len(archived)}件")
+    except Exception as e:
+        print("❌ エラー:", e)
@@ -0,0 +1,15 @@
+from services.position_history_service import PositionHistoryService
+
+# 定期実行（cron等、1時間ごと程度）を想定した位置履歴パーティションのメンテナンス
+# 1. 今後数日分のパーティションを作成
+# 2. 24時間以上前の日のパーティションを10分に1件へ間引く
+# 3. 保持期間を過ぎたパーティションを削除
+
+if __name__ == "__main__":
+    try:
+        PositionHistoryService.ensure_partitions()
+        compacted = PositionHistoryService.compact_old_partitions()
+        dropped = PositionHistoryService.drop_old_partitions()
+        print(f"✅ メンテナンス完了: 間引き{len(compacted)}件, 削除{len(dropped)}件")
+    except Exception as e:
+        print("❌ エラー:", e)
@@ -1,10 +1,14 @@
 import os
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 import logging
+import threading
 import time
 
+from core.metrics import Metrics
+
 logger = logging.getLogger(__name__)
 
 # SQLAlchemy側のコネクション設定
@@ -40,8 +44,17 @@ def build_database_urls():
     
     return database_url
 
+def build_async_database_url(database_url: str) -> str:
+    """同期用URLからasyncpg用のURLを構築"""
+    async_database_url = os.getenv('ASYNC_DATABASE_URL')
+    if async_database_url:
+        return async_database_url
+    
+    return 'postgresql+asyncpg://' + database_url.split('://', 1)[-1]
+
 # データベースURLを取得
 DATABASE_URL = build_database_urls()
+ASYNC_DATABASE_URL = build_async_database_url(DATABASE_URL)
 
 # デバッグ用ログ出力
 logger.info(f"データベースURL設定完了:")
@@ -115,15 +128,121 @@ def create_optimized_engine(database_url: str, engine_type: str = "standard"):
     
     return engine
 
+def create_optimized_async_engine(database_url: str, engine_type: str = "standard"):
+    """最適化された非同期エンジン（asyncpg）を作成"""
+    
+    pool_size = DatabaseConfig.POOL_SIZE
+    max_overflow = DatabaseConfig.MAX_OVERFLOW
+    pool_timeout = DatabaseConfig.POOL_TIMEOUT
+    app_name_suffix = f"{engine_type}_async"
+    
+    # SSE用の接続では長時間のクエリタイムアウトを設定
+    if engine_type == "sse":
+        statement_timeout = '600000'  # 10分
+        idle_in_transaction_timeout = '1800000'  # 30分
+    else:
+        statement_timeout = '300000'  # 5分
+        idle_in_transaction_timeout = '600000'  # 10分
+    
+    logger.info(f"非同期エンジン作成 ({engine_type}): プールサイズ={pool_size}, オーバーフロー={max_overflow}")
+    
+    async_engine = create_async_engine(
+        database_url,
+        
+        # プール設定（AsyncAdaptedQueuePool）
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=DatabaseConfig.POOL_RECYCLE,
+        pool_pre_ping=DatabaseConfig.POOL_PRE_PING,
+        
+        # パフォーマンス設定
+        echo=DatabaseConfig.ECHO_SQL,
+        
+        # 接続設定（asyncpgはlibpqのoptionsではなくserver_settingsで指定）
+        connect_args={
+            "timeout": DatabaseConfig.CONNECT_TIMEOUT,
+            "server_settings": {
+                "application_name": f"yoride_shop_{app_name_suffix}",
+                "timezone": "UTC",
+                "statement_timeout": statement_timeout,
+                "idle_in_transaction_session_timeout": idle_in_transaction_timeout,
+                "lock_timeout": "30000",  # 30秒
+                "deadlock_timeout": "1000",  # 1秒
+            },
+        },
+        
+        pool_reset_on_return='commit',
+        isolation_level="READ COMMITTED"
+    )
+    
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_connection_settings(dbapi_connection, connection_record):
+        """接続時の設定"""
+        connection_record.info['connect_time'] = time.time()
+        logger.debug(f"新規DB接続作成: {app_name_suffix}")
+    
+    return async_engine
+
+def register_pool_metrics(sync_engine, pool_name: str):
+    """コネクションプールの貸出・返却を計測し、メトリクスとして公開"""
+    checked_out = {}  # connection_record id → 貸出時刻
+    lock = threading.Lock()
+    
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        """プールから接続を貸し出した時の処理"""
+        with lock:
+            checked_out[id(connection_record)] = time.time()
+        Metrics.incr(f"db_pool_{pool_name}_checkouts")
+    
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        """プールへ接続が返却された時の処理"""
+        with lock:
+            checkout_time = checked_out.pop(id(connection_record), None)
+        Metrics.incr(f"db_pool_{pool_name}_checkins")
+        if checkout_time is not None:
+            Metrics.incr(f"db_pool_{pool_name}_held_seconds_total", time.time() - checkout_time)
+    
+    def oldest_checkout_seconds():
+        """最も長く貸し出されている接続の経過秒数（リーク検知用）"""
+        with lock:
+            if not checked_out:
+                return 0.0
+            return time.time() - min(checked_out.values())
+    
+    pool = sync_engine.pool
+    Metrics.register_gauge(f"db_pool_{pool_name}_checked_out", pool.checkedout)
+    Metrics.register_gauge(f"db_pool_{pool_name}_size", pool.size)
+    Metrics.register_gauge(f"db_pool_{pool_name}_overflow", pool.overflow)
+    Metrics.register_gauge(f"db_pool_{pool_name}_oldest_checkout_seconds", oldest_checkout_seconds)
+
 # 標準エンジン（通常のAPI用）
 try:
     engine = create_optimized_engine(DATABASE_URL, "standard")
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    register_pool_metrics(engine, "standard")
     logger.info("DB標準エンジン作成完了")
 except Exception as e:
     logger.error(f"DB標準エンジン作成エラー: {e}")
     raise
 
+# 非同期エンジン（asyncpg、async defのAPI用）
+try:
+    async_engine = create_optimized_async_engine(ASYNC_DATABASE_URL, "standard")
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+    register_pool_metrics(async_engine.sync_engine, "standard_async")
+    logger.info("DB非同期エンジン作成完了")
+except Exception as e:
+    logger.error(f"DB非同期エンジン作成エラー: {e}")
+    raise
+
 # セッション取得関数
 def get_db():
     """標準DB接続"""
@@ -132,3 +251,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    非同期DB接続（リクエストスコープ）
+    
+    FastAPIは同一リクエスト内で同じ依存関係の結果を共有するため、
+    認証（get_current_user）とエンドポイントは同じセッション・同じ接続を使用する
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
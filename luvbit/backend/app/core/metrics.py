@@ -0,0 +1,59 @@
+import threading
+from typing import Callable, Dict
+
+
+class Metrics:
+    """プロセス内メトリクス（カウンタ・ゲージ）を管理するクラス"""
+
+    _counters: Dict[str, float] = {}
+    _gauges: Dict[str, Callable[[], float]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def incr(cls, name: str, value: float = 1) -> None:
+        """
+        カウンタを加算する
+
+        Args:
+            name: メトリクス名
+            value: 加算値
+        """
+        with cls._lock:
+            cls._counters[name] = cls._counters.get(name, 0) + value
+
+    @classmethod
+    def get(cls, name: str) -> float:
+        """カウンタの現在値を取得する"""
+        with cls._lock:
+            return cls._counters.get(name, 0)
+
+    @classmethod
+    def register_gauge(cls, name: str, func: Callable[[], float]) -> None:
+        """
+        ゲージを登録する（値は取得時にfuncを呼び出して計算）
+
+        Args:
+            name: メトリクス名
+            func: 現在値を返す関数
+        """
+        with cls._lock:
+            cls._gauges[name] = func
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, float]:
+        """
+        全メトリクスの現在値を取得する
+
+        Returns:
+            Dict[str, float]: メトリクス名と値のマッピング
+        """
+        with cls._lock:
+            values = dict(cls._counters)
+            gauges = dict(cls._gauges)
+
+        for name, func in gauges.items():
+            try:
+                values[name] = func()
+            except Exception as e:
+                print(f"メトリクス取得エラー ({name}): {e}")
+        return dict(sorted(values.items()))
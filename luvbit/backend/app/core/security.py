@@ -1,20 +1,46 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Union
 from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.user import User
 from schemas.auth import UserInfo
 
-from core.db import get_db
+from core.db import get_async_db
+from core.metrics import Metrics
+from core.user_cache import UserInfoCache
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"v1/login")
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# パスワードハッシュ設定
+class PasswordHashConfig:
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))               # bcryptのコスト
+    MAX_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '4'))          # ハッシュ計算スレッド数
+    MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))     # 同時受付上限（実行中＋待機中）
+
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=PasswordHashConfig.BCRYPT_ROUNDS
+)
+
+# bcryptはGILを解放するため、専用スレッドプールで実行してイベントループを止めない
+_hash_executor = ThreadPoolExecutor(
+    max_workers=PasswordHashConfig.MAX_WORKERS,
+    thread_name_prefix="password_hash"
+)
+_hash_pending = 0
+Metrics.register_gauge("password_hash_pending", lambda: _hash_pending)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """パスワードを検証する"""
@@ -24,6 +50,38 @@ def get_password_hash(password: str) -> str:
     """パスワードをハッシュ化する"""
     return pwd_context.hash(password)
 
+async def _run_password_hash(func, *args):
+    """
+    パスワードハッシュ処理をスレッドプールで実行する
+    
+    Raises:
+        HTTPException: 受付上限を超えている場合（503）
+    """
+    global _hash_pending
+    
+    if _hash_pending >= PasswordHashConfig.MAX_PENDING:
+        Metrics.incr("password_hash_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests",
+            headers={"Retry-After": "1"},
+        )
+    
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """パスワードを検証する（イベントループをブロックしない）"""
+    return await _run_password_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """パスワードをハッシュ化する（イベントループをブロックしない）"""
+    return await _run_password_hash(get_password_hash, password)
+
 def create_access_token(
     data: dict, expires_delta: Union[timedelta, None] = None
 ) -> str:
@@ -33,19 +91,22 @@ def create_access_token(
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, "your-secret-key-here", algorithm="HS256")
     return encoded_jwt
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
 ) -> UserInfo:
     """
     現在のログインユーザーを取得する
     
+    キャッシュ、トークンのクレームの順に参照し、どちらも使えない場合のみDBを検索する
+    
     Args:
         token: JWTトークン
-        db: データベースセッション
+        db: データベースセッション（エンドポイントと共有）
     
     Returns:
         User: ログインユーザー情報
@@ -62,17 +123,35 @@ async def get_current_user(
     try:
         payload = jwt.decode(token, "your-secret-key-here", algorithms=["HS256"])
         email: str = payload.get("sub")
+        user_id: Union[int, None] = payload.get("user_id")
     except JWTError:
         raise credentials_exception
 
-    db = next(get_db())
-    user = db.query(User).filter(User.email == email).first()
+    if user_id is not None:
+        cached_user = UserInfoCache.get(user_id)
+        if cached_user is not None and cached_user.email == email:
+            return cached_user
+        
+        # トークンに必要なクレームが揃っていればDBを参照しない
+        uuid = payload.get("uuid")
+        nick_name = payload.get("nick_name")
+        if email and uuid and nick_name is not None and UserInfoCache.claims_usable(user_id, payload.get("iat")):
+            user_info = UserInfo(id=user_id, uuid=uuid, email=email, nick_name=nick_name)
+            UserInfoCache.put(user_info)
+            return user_info
+
+    result = await db.execute(
+        select(User.id, User.uuid, User.email, User.nick_name).where(User.email == email)
+    )
+    user = result.first()
     if user is None:
         raise credentials_exception
     
-    return UserInfo(
+    user_info = UserInfo(
         id=user.id,
         uuid=user.uuid,
         email=user.email,
         nick_name=user.nick_name
-    )
\ No newline at end of file
+    )
+    UserInfoCache.put(user_info)
+    return user_info
\ No newline at end of file
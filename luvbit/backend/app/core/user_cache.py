@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from core.metrics import Metrics
+from models.user import User
+from schemas.auth import UserInfo
+
+
+class UserCacheConfig:
+    # キャッシュ設定
+    TTL_SECONDS = float(os.getenv('USER_CACHE_TTL', '60'))            # エントリ有効期間（他のワーカーでの更新が反映されるまでの最大時間）
+    MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000'))   # 最大エントリ数
+
+
+class UserInfoCache:
+    """
+    認証済みユーザー情報（UserInfo）のプロセス内TTLキャッシュ
+
+    無効化はプロセス内でのみ行われる（ORMでの更新・削除時は自動、Coreのupdate(User)の後は
+    呼び出し側でinvalidateする）。他のワーカーのキャッシュとトークンのクレームは
+    最大TTL_SECONDSの間、更新前のユーザー情報を返しうる
+    """
+
+    _entries: "OrderedDict[int, Tuple[UserInfo, float]]" = OrderedDict()
+    _invalidated_at: Dict[int, float] = {}  # ユーザーID → 最終無効化時刻
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, user_id: int) -> Optional[UserInfo]:
+        """
+        キャッシュされたユーザー情報を取得する
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            UserInfo: ユーザー情報（キャッシュが無い・期限切れの場合はNone）
+        """
+        with cls._lock:
+            item = cls._entries.get(user_id)
+            if item is None:
+                Metrics.incr("user_cache_misses")
+                return None
+            user_info, expires_at = item
+            if expires_at <= time.time():
+                del cls._entries[user_id]
+                Metrics.incr("user_cache_misses")
+                return None
+            cls._entries.move_to_end(user_id)
+        Metrics.incr("user_cache_hits")
+        return user_info
+
+    @classmethod
+    def put(cls, user_info: UserInfo) -> None:
+        """
+        ユーザー情報をキャッシュする
+
+        Args:
+            user_info: ユーザー情報
+        """
+        with cls._lock:
+            cls._entries[user_info.id] = (user_info, time.time() + UserCacheConfig.TTL_SECONDS)
+            cls._entries.move_to_end(user_info.id)
+            while len(cls._entries) > UserCacheConfig.MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, user_id: int) -> None:
+        """
+        ユーザー情報のキャッシュを無効化する
+
+        無効化時刻より前に発行されたトークンのクレームも信用しないようにする
+
+        Args:
+            user_id: ユーザーID
+        """
+        with cls._lock:
+            cls._entries.pop(user_id, None)
+            cls._invalidated_at[user_id] = time.time()
+
+    @classmethod
+    def claims_usable(cls, user_id: int, issued_at: Optional[float]) -> bool:
+        """
+        トークンのクレームをユーザー情報として利用できるかを判定する
+
+        Args:
+            user_id: ユーザーID
+            issued_at: トークン発行時刻（iat）
+
+        Returns:
+            bool: TTL_SECONDS以内かつ最終無効化より後に発行されたトークンであればTrue
+        """
+        # 他のワーカーでの無効化は届かないため、古いトークンのクレームは使わない
+        if issued_at is None or time.time() - issued_at > UserCacheConfig.TTL_SECONDS:
+            return False
+        with cls._lock:
+            invalidated_at = cls._invalidated_at.get(user_id)
+        return invalidated_at is None or issued_at > invalidated_at
+
+    @classmethod
+    def clear(cls) -> None:
+        """キャッシュを全て削除する"""
+        with cls._lock:
+            cls._entries.clear()
+            cls._invalidated_at.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_info(mapper, connection, target):
+    """ユーザーレコードの更新・削除時にキャッシュを無効化"""
+    UserInfoCache.invalidate(target.id)
@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.v1 import api_router
 from services.satellite_service import SatelliteService
+from services.chat_hub import ChatHub
+from services.position_buffer import PositionWriteBuffer
 
 app = FastAPI(
     title="Luvbit API",
@@ -20,6 +22,16 @@ async def startup_event():
         print(f"衛星データを読み込みました。衛星数: {SatelliteService.get_satellite_count()}")
     else:
         print("衛星データの読み込みに失敗しました。デフォルトデータを使用します。")
+    # チャットイベントのプロセス間配信（LISTEN/NOTIFY）を開始
+    await ChatHub.start_listener()
+    # 位置情報のまとめ書き込みを開始
+    await PositionWriteBuffer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """アプリケーション終了時の処理"""
+    await ChatHub.stop_listener()
+    await PositionWriteBuffer.stop()
 
 # CORS設定を追加
 app.add_middleware(
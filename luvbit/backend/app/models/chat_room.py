@@ -11,6 +11,14 @@ class ChatRoom(BaseModel):
     created_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
 
+    # 集計値（メッセージ送信・既読時に更新）
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(TIMESTAMP, nullable=True)
+    user1_unread_count = Column(Integer, nullable=False, server_default=text('0'))
+    user2_unread_count = Column(Integer, nullable=False, server_default=text('0'))
+    user1_last_read_message_id = Column(Integer, nullable=False, server_default=text('0'))
+    user2_last_read_message_id = Column(Integer, nullable=False, server_default=text('0'))
+
     # リレーションシップ
     user1 = relationship("User", foreign_keys=[user1_id])
     user2 = relationship("User", foreign_keys=[user2_id])
@@ -21,6 +29,10 @@ class ChatRoom(BaseModel):
         UniqueConstraint('user1_id', 'user2_id', name='unique_user_pair'),
         Index('idx_chat_rooms_user1', 'user1_id'),
         Index('idx_chat_rooms_user2', 'user2_id'),
+        Index('idx_chat_rooms_user1_unread', 'user1_id', 'user1_unread_count',
+              postgresql_where=text('user1_unread_count > 0')),
+        Index('idx_chat_rooms_user2_unread', 'user2_id', 'user2_unread_count',
+              postgresql_where=text('user2_unread_count > 0')),
     )
 
     def get_partner_id(self, current_user_id: int) -> int:
@@ -33,4 +45,10 @@ class ChatRoom(BaseModel):
         """現在のユーザーの相手のユーザー情報を取得"""
         if self.user1_id == current_user_id:
             return self.user2
-        return self.user1
\ No newline at end of file
+        return self.user1
+
+    def get_unread_count(self, current_user_id: int) -> int:
+        """現在のユーザーの未読メッセージ数を取得"""
+        if self.user1_id == current_user_id:
+            return self.user1_unread_count
+        return self.user2_unread_count
@@ -6,12 +6,16 @@ from .base import BaseModel
 class Message(BaseModel):
     __tablename__ = 'messages'
 
+    # 主キーが(id, created_at)の複合キーになるため、idの採番を明示
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
     chat_room_id = Column(Integer, ForeignKey('chat_rooms.id', ondelete='CASCADE'), nullable=False)
     sender_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     message_text = Column(Text, nullable=False)
     message_type = Column(String(20), server_default='text', nullable=False)
     is_read = Column(Boolean, server_default=text('false'), nullable=False)
-    created_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+    # 月単位のレンジパーティションのキー（主キーに含める）
+    created_at = Column(TIMESTAMP, primary_key=True, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
 
     # リレーションシップ
     chat_room = relationship("ChatRoom", back_populates="messages")
@@ -22,4 +26,8 @@ class Message(BaseModel):
         Index('idx_messages_chat_room', 'chat_room_id'),
         Index('idx_messages_sender', 'sender_id'),
         Index('idx_messages_created_at', 'created_at'),
+        Index('idx_messages_room_created_id', 'chat_room_id', 'created_at', 'id'),
+        Index('idx_messages_text_trgm', 'message_text',
+              postgresql_using='gin', postgresql_ops={'message_text': 'gin_trgm_ops'}),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
\ No newline at end of file
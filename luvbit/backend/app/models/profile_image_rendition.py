@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+
+from .base import BaseModel
+
+class ProfileImageRendition(BaseModel):
+    __tablename__ = 'profile_image_renditions'
+
+    # 元画像のハッシュ・サイズ・形式で一意（同じ画像は1組のみ保持）
+    image_hash = Column(String(64), nullable=False)
+    size = Column(Integer, nullable=False)           # 長辺のピクセル数（0は元のサイズ）
+    format = Column(String(16), nullable=False)      # 'original' または 'webp'
+    content_type = Column(String(32), nullable=False)
+    blob_hash = Column(String(64), nullable=False)   # ブロブストアのキー
+
+    # 制約
+    __table_args__ = (
+        UniqueConstraint('image_hash', 'size', 'format', name='uq_profile_image_renditions'),
+    )
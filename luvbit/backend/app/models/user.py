@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, LargeBinary, String, TIMESTAMP, text
+from sqlalchemy import Column, Integer, String, TIMESTAMP, text
 
 from .base import BaseModel
 
@@ -9,7 +9,8 @@ class User(BaseModel):
     email = Column(String(255), nullable=False, unique=True)
     password = Column(String(255), nullable=False)
     nick_name = Column(String(32), nullable=False)
-    profile_image = Column(LargeBinary, nullable=True)
+    # プロフィール画像のSHA-256（16進）。画像本体はブロブストアに保存
+    profile_image_hash = Column(String(64), nullable=True)
     age = Column(Integer, nullable=False, default=None)
     sex = Column(Integer, nullable=False, default=None)
     constellation = Column(String(32), nullable=False, default=None)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, TIMESTAMP, text, ForeignKey
+from sqlalchemy import Column, Integer, Float, TIMESTAMP, text, ForeignKey, Index
 
 from .base import BaseModel
 
@@ -8,7 +8,14 @@ class UserPosition(BaseModel):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, unique=True)
     lng = Column(Float, nullable=False)
     lat = Column(Float, nullable=False)
+    # 位置のグリッドセルキー（services.geocell.STORAGE_GRID、書き込み時に設定）
+    geocell = Column(Integer, nullable=True)
     updated_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
     
     # リレーションシップ（必要に応じて）
-    # user = relationship("User", back_populates="position")
\ No newline at end of file
+    # user = relationship("User", back_populates="position")
+
+    # インデックス
+    __table_args__ = (
+        Index('idx_user_positions_geocell', 'geocell'),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, BigInteger, Integer, Float, TIMESTAMP, ForeignKey, Index
+
+from .base import BaseModel
+
+class UserPositionHistory(BaseModel):
+    __tablename__ = 'user_position_history'
+
+    # 主キーが(id, recorded_at)の複合キーになるため、idの採番を明示
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    lng = Column(Float, nullable=False)
+    lat = Column(Float, nullable=False)
+    # 位置のグリッドセルキー（services.geocell.STORAGE_GRID）
+    geocell = Column(Integer, nullable=False)
+    # 端末での測位時刻（UTC）。日単位のレンジパーティションのキー（主キーに含める）
+    recorded_at = Column(TIMESTAMP, primary_key=True, nullable=False)
+
+    # インデックス
+    __table_args__ = (
+        Index('idx_user_position_history_user_recorded', 'user_id', 'recorded_at'),
+        Index('idx_user_position_history_geocell_recorded', 'geocell', 'recorded_at'),
+        {'postgresql_partition_by': 'RANGE (recorded_at)'},
+    )
@@ -11,7 +11,7 @@ class ChatRoomInfo(BaseModel):
     id: int
     partner_id: int
     partner_nickname: str
-    partner_profile_image: Optional[str] = None
+    partner_profile_image_url: Optional[str] = None  # バージョン付きのプロフィール画像URL
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
     unread_count: int = 0
@@ -52,7 +52,44 @@ class ChatRoomResponse(BaseModel):
 class MessageListResponse(BaseModel):
     """メッセージ一覧レスポンス"""
     messages: List[MessageInfo]
-    total_count: int
+    total_count: Optional[int] = None
+    next_cursor: Optional[str] = None  # より古いメッセージの取得用（beforeに指定）
+    prev_cursor: Optional[str] = None  # より新しいメッセージの取得用（afterに指定）
+    has_more: bool = False  # 取得方向にさらにメッセージがあるか
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class UnreadCountResponse(BaseModel):
+    """未読メッセージ数レスポンス"""
+    unread_count: int = 0
+
+class MessageSyncResponse(BaseModel):
+    """メッセージ差分同期レスポンス"""
+    messages: List[MessageInfo]
+    high_water_mark: int  # 次回のsince_idに指定する値
+    has_more: bool = False  # 未取得の新着メッセージがさらにあるか
+    my_last_read_message_id: int = 0  # 自分が既読にした最大のメッセージID
+    partner_last_read_message_id: int = 0  # 相手が既読にした最大のメッセージID
+
+class MarkReadRequest(BaseModel):
+    """まとめて既読リクエスト"""
+    up_to_message_id: int  # このID以下の相手のメッセージを既読にする
+
+class MarkReadResponse(BaseModel):
+    """まとめて既読レスポンス"""
+    updated_count: int = 0
+    last_read_message_id: int = 0
+    message: str = "メッセージを既読にしました"
+
+class MessageSearchHit(BaseModel):
+    """メッセージ検索結果"""
+    message: MessageInfo
+    snippet: str  # 一致箇所周辺の抜粋
+    highlights: List[List[int]] = []  # snippet内の一致範囲 [開始, 終了) のリスト
+
+class MessageSearchResponse(BaseModel):
+    """メッセージ検索レスポンス"""
+    results: List[MessageSearchHit]
+    next_cursor: Optional[str] = None  # 続きの取得用（beforeに指定）
+    has_more: bool = False
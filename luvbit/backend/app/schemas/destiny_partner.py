@@ -9,7 +9,7 @@ class DestinyPartnerResponse(BaseModel):
     """運命のパートナー検索レスポンス"""
     user_id: Optional[int] = None
     nickname: Optional[str] = None
-    profile_image: Optional[str] = None
+    profile_image_url: Optional[str] = None  # バージョン付きのプロフィール画像URL
     age: Optional[int] = None
     sex: Optional[str] = None
     constellation: Optional[str] = None
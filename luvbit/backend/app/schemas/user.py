@@ -13,4 +13,10 @@ class UserResponse(BaseModel):
     nick_name: str
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ProfileImageResponse(BaseModel):
+    """プロフィール画像アップロードレスポンス"""
+    profile_image_url: str
+    profile_image_thumbnail_url: str
+    message: str = "プロフィール画像を更新しました"
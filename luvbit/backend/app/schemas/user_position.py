@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import datetime
 
 class UserPositionRequest(BaseModel):
     """位置情報登録リクエスト"""
@@ -13,4 +14,22 @@ class UserPositionResponse(BaseModel):
     lng: float
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PositionFix(BaseModel):
+    """測位結果（1件）"""
+    lat: float
+    lng: float
+    recorded_at: datetime  # 端末での測位時刻
+
+class UserPositionBatchRequest(BaseModel):
+    """位置情報一括登録リクエスト"""
+    fixes: List[PositionFix] = Field(..., min_length=1, max_length=500)
+
+class UserPositionBatchResponse(BaseModel):
+    """位置情報一括登録レスポンス"""
+    user_id: int
+    accepted_count: int  # 受け付けた測位結果の件数
+    lat: float  # 採用した最新の位置
+    lng: float
+    recorded_at: datetime
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from core.metrics import Metrics
+
+
+class BlobStoreConfig:
+    # ファイルストア設定
+    ROOT = os.getenv('BLOB_STORE_DIR', '/app/data/blobs')   # 保存先ディレクトリ
+
+
+_BLOB_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobStore:
+    """SHA-256をキーにしたファイルストア（同じ内容は1ファイルのみ保持）"""
+
+    @classmethod
+    def path_for(cls, blob_hash: str) -> str:
+        """
+        ブロブのファイルパスを取得する
+
+        Args:
+            blob_hash: 内容のSHA-256（16進）
+
+        Returns:
+            str: ファイルパス（ROOT/ab/cd/abcd...）
+
+        Raises:
+            ValueError: ハッシュの形式が不正な場合
+        """
+        if not _BLOB_HASH.match(blob_hash or ''):
+            raise ValueError(f"不正なブロブのハッシュです: {blob_hash}")
+        return os.path.join(BlobStoreConfig.ROOT, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    @classmethod
+    def exists(cls, blob_hash: str) -> bool:
+        """ブロブが保存されているか"""
+        return os.path.exists(cls.path_for(blob_hash))
+
+    @classmethod
+    def put(cls, data: bytes) -> str:
+        """
+        データを保存する（既に同じ内容があれば書き込まない）
+
+        Args:
+            data: 保存するデータ
+
+        Returns:
+            str: 内容のSHA-256（16進）
+        """
+        blob_hash = hashlib.sha256(data).hexdigest()
+        if cls.exists(blob_hash):
+            Metrics.incr("blob_store_dedup_hits")
+            return blob_hash
+
+        fd, tmp_path = cls.temp_file()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        cls.commit_file(tmp_path, blob_hash)
+        return blob_hash
+
+    @classmethod
+    def temp_file(cls):
+        """
+        書き込み用の一時ファイルを作成する（commit_fileで保存先へ移動する）
+
+        Returns:
+            Tuple[int, str]: ファイルディスクリプタとパス
+        """
+        tmp_dir = os.path.join(BlobStoreConfig.ROOT, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        return tempfile.mkstemp(dir=tmp_dir)
+
+    @classmethod
+    def commit_file(cls, tmp_path: str, blob_hash: str) -> str:
+        """
+        書き込み済みの一時ファイルを保存先へ移動する
+
+        保存先と同じファイルシステム上の一時ファイルをrenameするため、
+        読み込み中のクライアントに書きかけのファイルが見えることはない
+
+        Args:
+            tmp_path: 一時ファイルのパス（temp_fileで作成したもの）
+            blob_hash: 内容のSHA-256（16進）
+
+        Returns:
+            str: 内容のSHA-256（16進）
+        """
+        path = cls.path_for(blob_hash)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            Metrics.incr("blob_store_dedup_hits")
+            return blob_hash
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        Metrics.incr("blob_store_writes")
+        return blob_hash
+
+    @classmethod
+    def read(cls, blob_hash: str) -> bytes:
+        """
+        ブロブを読み込む
+
+        Raises:
+            FileNotFoundError: ブロブが存在しない場合
+        """
+        with open(cls.path_for(blob_hash), 'rb') as f:
+            return f.read()
+
+    @classmethod
+    def read_head(cls, blob_hash: str, size: int = 16) -> bytes:
+        """ブロブの先頭バイトを読み込む（形式判定用）"""
+        with open(cls.path_for(blob_hash), 'rb') as f:
+            return f.read(size)
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class ChatCacheConfig:
+    # キャッシュ設定
+    MESSAGE_COUNT_TTL = float(os.getenv('MESSAGE_COUNT_CACHE_TTL', '300'))        # 総数キャッシュの有効期間
+    MAX_ENTRIES = int(os.getenv('MESSAGE_COUNT_CACHE_MAX_ENTRIES', '10000'))      # 最大エントリ数
+
+
+class MessageCountCache:
+    """チャットルームごとのメッセージ総数のキャッシュ"""
+
+    _counts: Dict[int, Tuple[int, float]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, room_id: int) -> Optional[int]:
+        """
+        キャッシュされたメッセージ総数を取得する
+
+        Returns:
+            int: メッセージ総数（キャッシュが無い・期限切れの場合はNone）
+        """
+        with cls._lock:
+            item = cls._counts.get(room_id)
+            if item is None:
+                return None
+            count, expires_at = item
+            if expires_at <= time.time():
+                del cls._counts[room_id]
+                return None
+            return count
+
+    @classmethod
+    def put(cls, room_id: int, count: int) -> None:
+        """メッセージ総数をキャッシュする"""
+        with cls._lock:
+            if len(cls._counts) >= ChatCacheConfig.MAX_ENTRIES and room_id not in cls._counts:
+                now = time.time()
+                for key in [k for k, (_, expires_at) in cls._counts.items() if expires_at <= now]:
+                    del cls._counts[key]
+                if len(cls._counts) >= ChatCacheConfig.MAX_ENTRIES:
+                    cls._counts.pop(next(iter(cls._counts)))
+            cls._counts[room_id] = (count, time.time() + ChatCacheConfig.MESSAGE_COUNT_TTL)
+
+    @classmethod
+    def increment(cls, room_id: int, value: int = 1) -> None:
+        """キャッシュ済みの場合のみメッセージ総数を加算する"""
+        with cls._lock:
+            item = cls._counts.get(room_id)
+            if item is not None:
+                cls._counts[room_id] = (item[0] + value, item[1])
+
+    @classmethod
+    def invalidate(cls, room_id: int) -> None:
+        """メッセージ総数のキャッシュを削除する"""
+        with cls._lock:
+            cls._counts.pop(room_id, None)
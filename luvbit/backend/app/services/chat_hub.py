@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+
+import asyncpg
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import ASYNC_DATABASE_URL
+from core.metrics import Metrics
+
+
+class ChatHubConfig:
+    # Pub/Sub設定
+    CHANNEL = os.getenv('CHAT_NOTIFY_CHANNEL', 'chat_events')             # LISTEN/NOTIFYチャネル名
+    QUEUE_SIZE = int(os.getenv('CHAT_SUBSCRIBER_QUEUE_SIZE', '100'))       # 購読者ごとの送信待ち上限
+    RECONNECT_INTERVAL = float(os.getenv('CHAT_LISTEN_RECONNECT', '5'))    # LISTEN再接続間隔（秒）
+    MAX_NOTIFY_PAYLOAD = 7900                                              # NOTIFYペイロード上限（8000バイト未満）
+
+
+class ChatHub:
+    """ユーザーごとのチャットイベント配信を管理するプロセス内Pub/Sub"""
+
+    _subscribers: Dict[int, Set[asyncio.Queue]] = {}
+    _listener_task: Optional[asyncio.Task] = None
+    _listening = False
+
+    @classmethod
+    def subscribe(cls, user_id: int) -> asyncio.Queue:
+        """
+        ユーザー宛てのイベントを購読する
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            asyncio.Queue: イベントが届くキュー
+        """
+        queue = asyncio.Queue(maxsize=ChatHubConfig.QUEUE_SIZE)
+        cls._subscribers.setdefault(user_id, set()).add(queue)
+        Metrics.incr("chat_hub_subscriptions")
+        return queue
+
+    @classmethod
+    def unsubscribe(cls, user_id: int, queue: asyncio.Queue) -> None:
+        """購読を解除する"""
+        queues = cls._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del cls._subscribers[user_id]
+
+    @classmethod
+    def subscriber_count(cls) -> int:
+        """購読中の接続数を取得する"""
+        return sum(len(queues) for queues in cls._subscribers.values())
+
+    @classmethod
+    def publish_local(cls, user_ids: Iterable[int], event: Dict[str, Any]) -> None:
+        """
+        このプロセスの購読者へイベントを配信する
+
+        送信待ちが上限に達している購読者へのイベントは破棄する（クライアントは再同期で回復する）
+
+        Args:
+            user_ids: 配信先ユーザーID
+            event: イベント内容
+        """
+        for user_id in set(user_ids):
+            for queue in list(cls._subscribers.get(user_id, ())):
+                try:
+                    queue.put_nowait(event)
+                    Metrics.incr("chat_hub_events_delivered")
+                except asyncio.QueueFull:
+                    Metrics.incr("chat_hub_events_dropped")
+
+    @classmethod
+    def is_listening(cls) -> bool:
+        """LISTENによるプロセス間配信が有効か"""
+        return cls._listening
+
+    @classmethod
+    async def notify(cls, db: AsyncSession, user_ids: Iterable[int], event: Dict[str, Any]) -> bool:
+        """
+        トランザクション内でイベントをNOTIFYする（コミット時に全プロセスへ配信される）
+
+        LISTENが無効な場合は何もせずFalseを返すので、呼び出し側はコミット後にpublish_localで配信する
+
+        Args:
+            db: データベースセッション
+            user_ids: 配信先ユーザーID
+            event: イベント内容
+
+        Returns:
+            bool: NOTIFYした場合True
+        """
+        if not cls._listening:
+            return False
+        payload = cls.build_notify_payload(user_ids, event)
+        await db.execute(select(func.pg_notify(ChatHubConfig.CHANNEL, payload)))
+        return True
+
+    @classmethod
+    def build_notify_payload(cls, user_ids: Iterable[int], event: Dict[str, Any]) -> str:
+        """
+        NOTIFY用のペイロードを作成する
+
+        上限を超える場合はメッセージ本文を省略する（クライアントは差分同期で取得する）
+
+        Args:
+            user_ids: 配信先ユーザーID
+            event: イベント内容
+
+        Returns:
+            str: JSON文字列
+        """
+        payload = json.dumps({"user_ids": sorted(set(user_ids)), "event": event}, default=str)
+        if len(payload.encode('utf-8')) <= ChatHubConfig.MAX_NOTIFY_PAYLOAD:
+            return payload
+
+        event = dict(event)
+        if isinstance(event.get("message"), dict):
+            event["message"] = {k: v for k, v in event["message"].items() if k != "message_text"}
+        event["truncated"] = True
+        return json.dumps({"user_ids": sorted(set(user_ids)), "event": event}, default=str)
+
+    @classmethod
+    async def start_listener(cls) -> None:
+        """LISTEN/NOTIFYによるプロセス間配信を開始する"""
+        if cls._listener_task is None or cls._listener_task.done():
+            cls._listener_task = asyncio.create_task(cls._listen_forever())
+            Metrics.register_gauge("chat_hub_subscribers", cls.subscriber_count)
+
+    @classmethod
+    async def stop_listener(cls) -> None:
+        """LISTEN/NOTIFYによるプロセス間配信を停止する"""
+        if cls._listener_task is not None:
+            cls._listener_task.cancel()
+            try:
+                await cls._listener_task
+            except asyncio.CancelledError:
+                pass
+            cls._listener_task = None
+        cls._listening = False
+
+    @classmethod
+    def _on_notify(cls, connection, pid, channel, payload) -> None:
+        """NOTIFY受信時の処理"""
+        try:
+            data = json.loads(payload)
+            cls.publish_local(data["user_ids"], data["event"])
+        except Exception as e:
+            print(f"チャット通知の処理エラー: {e}")
+
+    @classmethod
+    async def _listen_forever(cls) -> None:
+        """LISTEN用の専用接続を維持する（切断時は再接続）"""
+        dsn = ASYNC_DATABASE_URL.replace('postgresql+asyncpg://', 'postgresql://', 1)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(ChatHubConfig.CHANNEL, cls._on_notify)
+                cls._listening = True
+                print(f"チャット通知のLISTENを開始しました: {ChatHubConfig.CHANNEL}")
+                while not connection.is_closed():
+                    await asyncio.sleep(ChatHubConfig.RECONNECT_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"チャット通知のLISTENエラー: {e}")
+            finally:
+                cls._listening = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(ChatHubConfig.RECONNECT_INTERVAL)
@@ -0,0 +1,95 @@
+from sqlalchemy import case, desc, literal, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models.chat_room import ChatRoom
+from models.message import Message
+from models.user import User
+
+
+class ChatRoomService:
+    """チャットルームのSQL文を作成するサービスクラス"""
+
+    @classmethod
+    def inbox_query(cls, user_id: int):
+        """
+        ユーザーが参加しているチャットルーム一覧を取得する1つのSELECT文を作成する
+
+        最新メッセージと未読数はchat_roomsの集計列（last_message_id, userN_unread_count）から
+        取得するため、ルーム数に関わらず1回の問い合わせで済む
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            Select: id, partner_id, created_at, nick_name, profile_image_hash,
+                    message_text, last_message_time, unread_count を返すSELECT文（更新日時の降順）
+        """
+        # 相手のユーザーID
+        partner_id = case(
+            (ChatRoom.user1_id == user_id, ChatRoom.user2_id),
+            else_=ChatRoom.user1_id
+        )
+
+        # 自分の未読数（チャットルームの集計値）
+        unread_count = case(
+            (ChatRoom.user1_id == user_id, ChatRoom.user1_unread_count),
+            else_=ChatRoom.user2_unread_count
+        )
+
+        return select(
+            ChatRoom.id,
+            partner_id.label('partner_id'),
+            ChatRoom.created_at,
+            User.nick_name,
+            User.profile_image_hash,
+            Message.message_text,
+            ChatRoom.last_message_at.label('last_message_time'),
+            unread_count.label('unread_count')
+        ).select_from(
+            ChatRoom
+        ).join(
+            User, User.id == partner_id
+        ).outerjoin(
+            Message, Message.id == ChatRoom.last_message_id
+        ).where(
+            or_(
+                ChatRoom.user1_id == user_id,
+                ChatRoom.user2_id == user_id
+            )
+        ).order_by(desc(ChatRoom.updated_at))
+
+    @classmethod
+    def get_or_create_query(cls, user_id: int, partner_user_id: int):
+        """
+        2人のチャットルームを作成し、既存のルームがあればそのIDを返す1つのSELECT文を作成する
+
+        unique_user_pairへのON CONFLICTで同時に作成されても一意性違反にならず、
+        createdはxmax = 0（この文で挿入した行）かどうかで判定する。
+        相手が存在しない場合は行を返さない
+
+        Args:
+            user_id: ユーザーID
+            partner_user_id: 相手のユーザーID
+
+        Returns:
+            Select: id, created, nick_name（相手のニックネーム）を返すSELECT文
+        """
+        # user1_idには小さいID、user2_idには大きいIDを設定して一意性を保つ
+        user1_id = min(user_id, partner_user_id)
+        user2_id = max(user_id, partner_user_id)
+
+        upsert = pg_insert(ChatRoom).from_select(
+            ['user1_id', 'user2_id'],
+            select(literal(user1_id), literal(user2_id)).where(User.id == partner_user_id)
+        )
+        room = upsert.on_conflict_do_update(
+            constraint='unique_user_pair',
+            set_={'user1_id': upsert.excluded.user1_id}
+        ).returning(
+            ChatRoom.id,
+            literal_column('xmax = 0').label('created')
+        ).cte('room')
+
+        return select(room.c.id, room.c.created, User.nick_name).join(
+            User, User.id == partner_user_id
+        )
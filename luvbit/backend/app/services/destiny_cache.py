@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from services import geocell
+
+
+class DestinyCacheConfig:
+    # キャッシュ設定
+    TTL_SECONDS = float(os.getenv('DESTINY_CACHE_TTL', '60'))                 # エントリ有効期間
+    TIME_BUCKET_SECONDS = int(os.getenv('DESTINY_CACHE_TIME_BUCKET', '300'))  # 時間バケット幅
+    MAX_ENTRIES = int(os.getenv('DESTINY_CACHE_MAX_ENTRIES', '1024'))         # 最大エントリ数
+
+
+class _CacheEntry:
+    __slots__ = ('candidate_ids', 'cells', 'expires_at')
+
+    def __init__(self, candidate_ids: FrozenSet[int], cells: FrozenSet[int], expires_at: float):
+        self.candidate_ids = candidate_ids
+        self.cells = cells
+        self.expires_at = expires_at
+
+
+CacheKey = Tuple[str, int, int]
+
+
+class DestinyPartnerCache:
+    """
+    運命のパートナー検索結果（候補ユーザーIDの集合）を保持するキャッシュ
+
+    候補集合は衛星・時間帯と他のユーザーの位置のみで決まるため、検索するユーザーに依らず共有する
+    （検索したユーザー自身の除外と補完は取得後に行う）
+    """
+
+    _entries: Dict[CacheKey, _CacheEntry] = {}
+    _cell_index: Dict[int, Set[CacheKey]] = {}  # セルキー → そのセルに依存するエントリ
+    _lock = threading.Lock()
+
+    @classmethod
+    def make_key(cls, satellite_name: str, now: Optional[float] = None, window_hours: int = 0) -> CacheKey:
+        """
+        キャッシュキーを作成する
+
+        Args:
+            satellite_name: 衛星名
+            now: 現在時刻（UNIX秒）
+            window_hours: 通過時刻を考慮する時間（時間、考慮しない場合は0）
+
+        Returns:
+            CacheKey: (衛星名, 時間バケット, 通過時刻を考慮する時間)
+        """
+        now = time.time() if now is None else now
+        return satellite_name, int(now // DestinyCacheConfig.TIME_BUCKET_SECONDS), window_hours
+
+    @classmethod
+    def get(cls, key: CacheKey) -> Optional[FrozenSet[int]]:
+        """
+        キャッシュされた候補ユーザーIDの集合を取得する
+
+        Returns:
+            FrozenSet[int]: 候補ユーザーID（キャッシュが無い・期限切れの場合はNone）
+        """
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                cls._remove(key)
+                return None
+            return entry.candidate_ids
+
+    @classmethod
+    def put(cls, key: CacheKey, candidate_ids: Iterable[int],
+            ground_track: List[Tuple[float, float]], tolerance_km: float) -> None:
+        """
+        候補ユーザーIDの集合をキャッシュする
+
+        Args:
+            key: キャッシュキー
+            candidate_ids: 候補ユーザーID
+            ground_track: 候補の算出に使用した衛星の地表面軌道
+            tolerance_km: 算出時の許容距離（km）
+        """
+        cells = set()
+        for sat_lat, sat_lng in ground_track:
+            cells |= geocell.cells_within_radius(sat_lat, sat_lng, tolerance_km)
+
+        entry = _CacheEntry(
+            candidate_ids=frozenset(candidate_ids),
+            cells=frozenset(cells),
+            expires_at=time.time() + DestinyCacheConfig.TTL_SECONDS
+        )
+
+        with cls._lock:
+            cls._remove(key)
+            if len(cls._entries) >= DestinyCacheConfig.MAX_ENTRIES:
+                cls._evict_expired()
+            if len(cls._entries) >= DestinyCacheConfig.MAX_ENTRIES:
+                # 最も早く期限切れになるエントリを削除
+                cls._remove(min(cls._entries, key=lambda k: cls._entries[k].expires_at))
+            cls._entries[key] = entry
+            for cell in entry.cells:
+                cls._cell_index.setdefault(cell, set()).add(key)
+
+    @classmethod
+    def invalidate_positions(cls, *positions: Tuple[Optional[float], Optional[float]]) -> int:
+        """
+        位置情報が変化したセルに依存するエントリを無効化する
+
+        Args:
+            positions: 変化前・変化後の (緯度, 経度)
+
+        Returns:
+            int: 無効化したエントリ数
+        """
+        cells = {
+            geocell.cell_key(lat, lng)
+            for lat, lng in positions
+            if lat is not None and lng is not None
+        }
+
+        with cls._lock:
+            keys = set()
+            for cell in cells:
+                keys |= cls._cell_index.get(cell, set())
+            for key in keys:
+                cls._remove(key)
+            return len(keys)
+
+    @classmethod
+    def clear(cls) -> None:
+        """キャッシュを全て削除する"""
+        with cls._lock:
+            cls._entries.clear()
+            cls._cell_index.clear()
+
+    @classmethod
+    def _remove(cls, key: CacheKey) -> None:
+        """エントリを削除する（ロック取得済みで呼び出すこと）"""
+        entry = cls._entries.pop(key, None)
+        if entry is None:
+            return
+        for cell in entry.cells:
+            keys = cls._cell_index.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del cls._cell_index[cell]
+
+    @classmethod
+    def _evict_expired(cls) -> None:
+        """期限切れのエントリを削除する（ロック取得済みで呼び出すこと）"""
+        now = time.time()
+        for key in [k for k, e in cls._entries.items() if e.expires_at <= now]:
+            cls._remove(key)
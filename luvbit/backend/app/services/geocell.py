@@ -0,0 +1,184 @@
+import math
+import os
+from typing import Iterable, List, Set, Tuple
+
+# 1度あたりの距離（km）
+KM_PER_DEG_LAT = 111.32
+
+# 地球の半径（km）
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    2点間の距離を計算する（ハーバーサイン公式）
+
+    Args:
+        lat1, lng1: 地点1の緯度、経度
+        lat2, lng2: 地点2の緯度、経度
+
+    Returns:
+        float: 距離（km）
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlng = math.radians(lng2 - lng1)
+
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GeoGrid:
+    """
+    緯度経度を正方セル（度単位）に分割するグリッド
+
+    セルキーは 行 * 列数 + 列 で、同じ行のセルは連続したキーになるため
+    行ごとの範囲検索（BETWEEN）に使える
+    """
+
+    def __init__(self, cell_size_deg: float):
+        self.cell_size_deg = cell_size_deg
+        self.cols = int(math.ceil(360.0 / cell_size_deg))
+        self.rows = int(math.ceil(180.0 / cell_size_deg))
+
+    def cell_row_col(self, lat: float, lng: float) -> Tuple[int, int]:
+        """
+        緯度経度からグリッドの行・列を計算する
+
+        Args:
+            lat: 緯度
+            lng: 経度
+
+        Returns:
+            Tuple[int, int]: (行, 列)
+        """
+        row = int(math.floor((max(-90.0, min(90.0, lat)) + 90.0) / self.cell_size_deg))
+        col = int(math.floor(((lng + 180.0) % 360.0) / self.cell_size_deg))
+        return min(row, self.rows - 1), col % self.cols
+
+    def cell_key(self, lat: float, lng: float) -> int:
+        """
+        緯度経度からセルキーを計算する
+
+        Args:
+            lat: 緯度
+            lng: 経度
+
+        Returns:
+            int: セルキー
+        """
+        row, col = self.cell_row_col(lat, lng)
+        return row * self.cols + col
+
+    def cells_within_radius(self, lat: float, lng: float, radius_km: float) -> Set[int]:
+        """
+        指定地点から半径radius_km以内に掛かるセルキーの集合を取得する
+
+        Args:
+            lat: 緯度
+            lng: 経度
+            radius_km: 半径（km）
+
+        Returns:
+            Set[int]: セルキーの集合
+        """
+        keys = set()
+        for start, end in self.key_ranges_within_radius(lat, lng, radius_km):
+            keys.update(range(start, end + 1))
+        return keys
+
+    def key_ranges_within_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[int, int]]:
+        """
+        指定地点から半径radius_km以内を覆うセルキーの範囲を取得する
+
+        Args:
+            lat: 緯度
+            lng: 経度
+            radius_km: 半径（km）
+
+        Returns:
+            List[Tuple[int, int]]: (開始キー, 終了キー) のリスト（両端を含む、昇順）
+        """
+        return self._merge_ranges(self._row_ranges(lat, lng, radius_km))
+
+    def key_ranges_along_track(self, points: Iterable[Tuple[float, float]],
+                               radius_km: float) -> List[Tuple[int, int]]:
+        """
+        経路（点列）の各点から半径radius_km以内を覆うセルキーの範囲を取得する
+
+        Args:
+            points: (緯度, 経度) の点列
+            radius_km: 半径（km）
+
+        Returns:
+            List[Tuple[int, int]]: 重なりを統合した (開始キー, 終了キー) のリスト（昇順）
+        """
+        ranges = []
+        for lat, lng in points:
+            ranges.extend(self._row_ranges(lat, lng, radius_km))
+        return self._merge_ranges(ranges)
+
+    def _row_ranges(self, lat: float, lng: float, radius_km: float):
+        """半径を覆うセルキーの範囲を行ごとに列挙する（経度180度をまたぐ場合は2つに分割）"""
+        for row, col_start, col_end in self._row_spans(lat, lng, radius_km):
+            base = row * self.cols
+            if col_start < 0:
+                yield base + col_start + self.cols, base + self.cols - 1
+                yield base, base + col_end
+            elif col_end >= self.cols:
+                yield base + col_start, base + self.cols - 1
+                yield base, base + col_end - self.cols
+            else:
+                yield base + col_start, base + col_end
+
+    def _row_spans(self, lat: float, lng: float, radius_km: float):
+        """半径を覆う (行, 開始列, 終了列) を列挙する（列は折り返し前の値）"""
+        dlat = radius_km / KM_PER_DEG_LAT
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+        dlng = min(180.0, radius_km / (KM_PER_DEG_LAT * max(cos_lat, 1e-6)))
+
+        row_min, _ = self.cell_row_col(lat - dlat, lng)
+        row_max, _ = self.cell_row_col(lat + dlat, lng)
+        lng = (lng + 180.0) % 360.0 - 180.0
+        col_start = int(math.floor((lng - dlng + 180.0) / self.cell_size_deg))
+        col_end = int(math.floor((lng + dlng + 180.0) / self.cell_size_deg))
+        if col_end - col_start + 1 >= self.cols:
+            col_start, col_end = 0, self.cols - 1
+
+        for row in range(row_min, row_max + 1):
+            yield row, col_start, col_end
+
+    @staticmethod
+    def _merge_ranges(ranges) -> List[Tuple[int, int]]:
+        """重なる・隣接する範囲を統合する"""
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+
+# キャッシュ用のグリッド（プロセス内でのみ使用するため設定で変更可能）
+CELL_SIZE_DEG = float(os.getenv('GEOCELL_SIZE_DEG', '0.05'))  # 約5.5km
+_GRID = GeoGrid(CELL_SIZE_DEG)
+
+# user_positions.geocell 用のグリッド（DBに保存するため固定。変更する場合は再計算が必要）
+STORAGE_GRID = GeoGrid(0.01)  # 約1.1km
+
+
+def cell_row_col(lat: float, lng: float) -> Tuple[int, int]:
+    """キャッシュ用グリッドの行・列を計算する"""
+    return _GRID.cell_row_col(lat, lng)
+
+
+def cell_key(lat: float, lng: float) -> int:
+    """キャッシュ用グリッドのセルキーを計算する"""
+    return _GRID.cell_key(lat, lng)
+
+
+def cells_within_radius(lat: float, lng: float, radius_km: float) -> Set[int]:
+    """キャッシュ用グリッドで半径radius_km以内に掛かるセルキーの集合を取得する"""
+    return _GRID.cells_within_radius(lat, lng, radius_km)
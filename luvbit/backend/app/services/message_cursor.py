@@ -0,0 +1,41 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    """
+    メッセージの (created_at, id) からページングカーソルを作成する
+
+    Args:
+        created_at: メッセージ作成日時
+        message_id: メッセージID
+
+    Returns:
+        str: URLセーフなカーソル文字列
+    """
+    raw = f"{created_at.isoformat()}|{message_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    ページングカーソルを (created_at, id) に変換する
+
+    Args:
+        cursor: カーソル文字列
+
+    Returns:
+        Tuple[datetime, int]: (作成日時, メッセージID)（カーソル未指定の場合はNone）
+
+    Raises:
+        ValueError: カーソルが不正な場合
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, message_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"不正なカーソルです: {cursor}")
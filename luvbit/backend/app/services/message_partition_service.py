@@ -0,0 +1,144 @@
+import csv
+import gzip
+import os
+import re
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from core.db import engine
+
+
+class MessagePartitionConfig:
+    # パーティション設定
+    PREMAKE_MONTHS = int(os.getenv('MESSAGE_PARTITION_PREMAKE_MONTHS', '3'))      # 先に作成しておく月数
+    RETENTION_MONTHS = int(os.getenv('MESSAGE_RETENTION_MONTHS', '12'))           # DBに残す月数
+    ARCHIVE_DIR = os.getenv('MESSAGE_ARCHIVE_DIR', '/app/data/archive/messages')  # アーカイブ出力先
+
+
+_PARTITION_NAME = re.compile(r'^messages_p(\d{4})_(\d{2})$')
+
+
+class MessagePartitionService:
+    """messagesテーブルの月単位パーティションを管理するサービスクラス"""
+
+    @staticmethod
+    def _add_months(month: date, count: int) -> date:
+        """月初の日付にcountヶ月を加算する"""
+        total = month.year * 12 + (month.month - 1) + count
+        return date(total // 12, total % 12 + 1, 1)
+
+    @classmethod
+    def partition_name(cls, month: date) -> str:
+        """月のパーティション名を取得する"""
+        return f"messages_p{month:%Y_%m}"
+
+    @classmethod
+    def list_partitions(cls) -> List[date]:
+        """
+        アタッチされているパーティションの月を取得する
+
+        Returns:
+            List[date]: パーティションの月（月初日、昇順）
+        """
+        with engine.connect() as connection:
+            names = connection.execute(text("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'messages'::regclass
+            """)).scalars().all()
+
+        months = []
+        for name in names:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    @classmethod
+    def ensure_partitions(cls, today: Optional[date] = None) -> List[str]:
+        """
+        現在月からPREMAKE_MONTHS先までのパーティションを作成する
+
+        Returns:
+            List[str]: 作成したパーティション名
+        """
+        current = (today or date.today()).replace(day=1)
+        existing = set(cls.list_partitions())
+        created = []
+
+        with engine.begin() as connection:
+            for offset in range(MessagePartitionConfig.PREMAKE_MONTHS + 1):
+                month = cls._add_months(current, offset)
+                if month in existing:
+                    continue
+                name = cls.partition_name(month)
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{cls._add_months(month, 1):%Y-%m-%d}')"
+                ))
+                created.append(name)
+
+        for name in created:
+            print(f"パーティションを作成しました: {name}")
+        return created
+
+    @classmethod
+    def archive_old_partitions(cls, today: Optional[date] = None) -> List[str]:
+        """
+        保持期間を過ぎたパーティションをデタッチし、圧縮ファイルへ書き出してから削除する
+
+        Returns:
+            List[str]: アーカイブしたファイルのパス
+        """
+        current = (today or date.today()).replace(day=1)
+        cutoff = cls._add_months(current, -MessagePartitionConfig.RETENTION_MONTHS)
+        os.makedirs(MessagePartitionConfig.ARCHIVE_DIR, exist_ok=True)
+
+        archived = []
+        for month in cls.list_partitions():
+            if month >= cutoff:
+                continue
+            archived.append(cls._archive_partition(month))
+        return archived
+
+    @classmethod
+    def _archive_partition(cls, month: date) -> str:
+        """
+        パーティションを1つアーカイブする
+
+        書き出しと件数の確認はアタッチしたまま行い、確認できた場合のみ
+        1トランザクションでデタッチ・削除する（途中で失敗してもメッセージが検索から消えない）
+        """
+        name = cls.partition_name(month)
+        path = os.path.join(MessagePartitionConfig.ARCHIVE_DIR, f"{name}.csv.gz")
+        tmp_path = f"{path}.tmp"
+
+        # CSV（gzip圧縮）で書き出し
+        raw_connection = engine.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                with gzip.open(tmp_path, 'wb') as f:
+                    cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+        # 本文に改行を含む行があるため、行数ではなくCSVのレコード数で確認
+        with gzip.open(tmp_path, 'rt', encoding='utf-8', newline='') as f:
+            exported = sum(1 for _ in csv.reader(f)) - 1  # ヘッダー行を除く
+
+        # 書き出した後に追加された行が無いことをロックした上で確認してから削除
+        with engine.begin() as connection:
+            connection.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+            row_count = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            if exported != row_count:
+                raise RuntimeError(f"アーカイブ件数が一致しません: {name} ({exported}/{row_count})")
+            os.replace(tmp_path, path)
+            connection.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+
+        print(f"パーティションをアーカイブしました: {name} → {path} ({row_count}件)")
+        return path
@@ -0,0 +1,55 @@
+import os
+from typing import List, Tuple
+
+
+class MessageSearchConfig:
+    # 検索設定
+    SNIPPET_RADIUS = int(os.getenv('MESSAGE_SEARCH_SNIPPET_RADIUS', '30'))  # 一致箇所の前後に含める文字数
+
+
+def escape_like(keyword: str) -> str:
+    """
+    LIKEパターンの特殊文字（\\ % _）をエスケープする
+
+    Args:
+        keyword: 検索キーワード
+
+    Returns:
+        str: エスケープ済みのキーワード（ESCAPE '\\' で使用）
+    """
+    return keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_snippet(message_text: str, keyword: str) -> Tuple[str, List[List[int]]]:
+    """
+    一致箇所周辺の抜粋とハイライト範囲を作成する
+
+    Args:
+        message_text: メッセージ本文
+        keyword: 検索キーワード
+
+    Returns:
+        Tuple[str, List[List[int]]]: 抜粋と、抜粋内の一致範囲 [開始, 終了) のリスト
+    """
+    lowered = message_text.lower()
+    needle = keyword.lower()
+    first = lowered.find(needle)
+    if not needle or first < 0:
+        return message_text[:MessageSearchConfig.SNIPPET_RADIUS * 2], []
+
+    radius = MessageSearchConfig.SNIPPET_RADIUS
+    start = max(0, first - radius)
+    end = min(len(message_text), first + len(needle) + radius)
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(message_text) else ''
+    snippet = prefix + message_text[start:end] + suffix
+
+    # 抜粋内の一致箇所を全て収集
+    highlights = []
+    position = first
+    while 0 <= position and position + len(needle) <= end:
+        offset = len(prefix) + position - start
+        highlights.append([offset, offset + len(needle)])
+        position = lowered.find(needle, position + len(needle))
+    return snippet, highlights
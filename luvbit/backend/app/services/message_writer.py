@@ -0,0 +1,229 @@
+import asyncio
+import os
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import AsyncSessionLocal
+from core.metrics import Metrics
+from models.chat_room import ChatRoom
+from models.message import Message
+from schemas.auth import UserInfo
+from schemas.chat import MessageInfo
+from services.chat_cache import MessageCountCache
+from services.chat_hub import ChatHub
+
+
+class MessageWriterConfig:
+    # グループコミット設定
+    GROUP_COMMIT_ENABLED = os.getenv('CHAT_GROUP_COMMIT', 'false').lower() == 'true'   # 有効/無効
+    GROUP_COMMIT_WINDOW_MS = float(os.getenv('CHAT_GROUP_COMMIT_WINDOW_MS', '5'))      # まとめる時間幅（ミリ秒）
+    GROUP_COMMIT_MAX_BATCH = int(os.getenv('CHAT_GROUP_COMMIT_MAX_BATCH', '100'))      # 1トランザクションの最大件数
+
+
+class SentMessage(NamedTuple):
+    """書き込み済み（コミット前）のメッセージ"""
+    message: MessageInfo
+    participants: Tuple[int, int]
+    notified: bool
+
+    def after_commit(self) -> None:
+        """コミット後の処理（キャッシュ更新・NOTIFYしていない場合のローカル配信）"""
+        MessageCountCache.increment(self.message.chat_room_id)
+        if not self.notified:
+            ChatHub.publish_local(self.participants, build_message_event(self.message))
+
+
+def build_message_event(message: MessageInfo) -> dict:
+    """新着メッセージイベントを作成する"""
+    return {
+        "type": "message",
+        "chat_room_id": message.chat_room_id,
+        "message": message.model_dump(mode='json', exclude={'is_mine'})
+    }
+
+
+async def write_message(db: AsyncSession, room_id: int, sender: UserInfo,
+                        message_text: str, message_type: str) -> Optional[SentMessage]:
+    """
+    メッセージを1文で書き込む（コミットは呼び出し側で行う）
+
+    参加者チェック・INSERT・チャットルームの集計値の更新を
+    INSERT ... RETURNING を含む1つのUPDATE文で行う
+
+    Args:
+        db: データベースセッション
+        room_id: チャットルームID
+        sender: 送信者（認証済みユーザー情報）
+        message_text: 本文
+        message_type: 種別
+
+    Returns:
+        SentMessage: 書き込んだメッセージ（チャットルームが無いか参加者でない場合はNone）
+    """
+    # 参加者の場合のみメッセージを作成
+    new_message = insert(Message).from_select(
+        ['chat_room_id', 'sender_id', 'message_text', 'message_type'],
+        select(
+            ChatRoom.id,
+            literal(sender.id),
+            literal(message_text),
+            literal(message_type)
+        ).where(
+            and_(
+                ChatRoom.id == room_id,
+                or_(ChatRoom.user1_id == sender.id, ChatRoom.user2_id == sender.id)
+            )
+        )
+    ).returning(
+        Message.id,
+        Message.chat_room_id,
+        Message.message_type,
+        Message.is_read,
+        Message.created_at
+    ).cte('new_message')
+
+    # 同じルームへの同時送信がID順と逆にコミットされても最新メッセージが戻らないようにする
+    is_newest = new_message.c.id > func.coalesce(ChatRoom.last_message_id, 0)
+
+    # チャットルームの更新日時・最新メッセージ・相手の未読数を更新
+    result = await db.execute(
+        update(ChatRoom).where(
+            ChatRoom.id == new_message.c.chat_room_id
+        ).values(
+            updated_at=func.now(),
+            last_message_id=func.greatest(ChatRoom.last_message_id, new_message.c.id),
+            last_message_at=case(
+                (is_newest, new_message.c.created_at),
+                else_=ChatRoom.last_message_at
+            ),
+            user1_unread_count=case(
+                (ChatRoom.user1_id != sender.id, ChatRoom.user1_unread_count + 1),
+                else_=ChatRoom.user1_unread_count
+            ),
+            user2_unread_count=case(
+                (ChatRoom.user2_id != sender.id, ChatRoom.user2_unread_count + 1),
+                else_=ChatRoom.user2_unread_count
+            )
+        ).returning(
+            ChatRoom.user1_id,
+            ChatRoom.user2_id,
+            new_message.c.id,
+            new_message.c.message_type,
+            new_message.c.is_read,
+            new_message.c.created_at
+        ).execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if row is None:
+        return None
+
+    message = MessageInfo(
+        id=row.id,
+        chat_room_id=room_id,
+        sender_id=sender.id,
+        sender_nickname=sender.nick_name,
+        message_text=message_text,
+        message_type=row.message_type,
+        is_read=row.is_read,
+        created_at=row.created_at,
+        is_mine=True
+    )
+
+    # 参加者へ新着メッセージを配信（NOTIFYはコミット時に送信される）
+    participants = (row.user1_id, row.user2_id)
+    notified = await ChatHub.notify(db, participants, build_message_event(message))
+    return SentMessage(message=message, participants=participants, notified=notified)
+
+
+class _PendingMessage(NamedTuple):
+    room_id: int
+    sender: UserInfo
+    message_text: str
+    message_type: str
+    future: asyncio.Future
+
+
+class MessageGroupCommitter:
+    """
+    短い時間幅に届いたメッセージ送信を1トランザクションにまとめてコミットする
+
+    各メッセージはセーブポイント内で書き込むため、1件の失敗は他の送信者に影響しない
+    """
+
+    _pending: List[_PendingMessage] = []
+    _flush_handle: Optional[asyncio.TimerHandle] = None
+    _flush_tasks: Set[asyncio.Task] = set()  # 実行中の書き込み（GCで破棄されないよう参照を保持）
+
+    @classmethod
+    async def submit(cls, room_id: int, sender: UserInfo,
+                     message_text: str, message_type: str) -> Optional[SentMessage]:
+        """
+        メッセージ送信を受け付け、まとめてコミットされるまで待機する
+
+        Returns:
+            SentMessage: コミット済みのメッセージ（チャットルームが無いか参加者でない場合はNone）
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cls._pending.append(_PendingMessage(room_id, sender, message_text, message_type, future))
+
+        if len(cls._pending) >= MessageWriterConfig.GROUP_COMMIT_MAX_BATCH:
+            cls._schedule_flush(loop, delay=0)
+        elif cls._flush_handle is None:
+            cls._schedule_flush(loop, delay=MessageWriterConfig.GROUP_COMMIT_WINDOW_MS / 1000.0)
+
+        return await future
+
+    @classmethod
+    def _schedule_flush(cls, loop: asyncio.AbstractEventLoop, delay: float) -> None:
+        """まとめたメッセージの書き込みを予約する"""
+        if cls._flush_handle is not None:
+            cls._flush_handle.cancel()
+        cls._flush_handle = loop.call_later(delay, cls._start_flush)
+
+    @classmethod
+    def _start_flush(cls) -> None:
+        """書き込みタスクを開始し、完了まで参照を保持する"""
+        task = asyncio.ensure_future(cls._flush())
+        cls._flush_tasks.add(task)
+        task.add_done_callback(cls._flush_tasks.discard)
+
+    @classmethod
+    async def _flush(cls) -> None:
+        """まとめたメッセージを1トランザクションで書き込む"""
+        cls._flush_handle = None
+        batch, cls._pending = cls._pending, []
+        if not batch:
+            return
+
+        results = []
+        try:
+            async with AsyncSessionLocal() as db:
+                for item in batch:
+                    try:
+                        async with db.begin_nested():
+                            sent = await write_message(
+                                db, item.room_id, item.sender, item.message_text, item.message_type
+                            )
+                        results.append((item, sent))
+                    except Exception as e:
+                        print(f"メッセージの書き込みエラー: room_id={item.room_id}, {e}")
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                await db.commit()
+        except Exception as e:
+            print(f"メッセージのグループコミットエラー: {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        Metrics.incr("chat_group_commits")
+        Metrics.incr("chat_group_commit_messages", len(results))
+        for item, sent in results:
+            if sent is not None:
+                sent.after_commit()
+            if not item.future.done():
+                item.future.set_result(sent)
@@ -0,0 +1,283 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from core.db import AsyncSessionLocal
+from core.metrics import Metrics
+from services.destiny_cache import DestinyPartnerCache
+from services.position_history_service import PositionHistoryService
+from services.user_position_service import PositionUpsertResult, UserPositionService
+
+
+class PositionBufferConfig:
+    # 位置情報の書き込み設定
+    WRITE_BEHIND_ENABLED = os.getenv('POSITION_WRITE_BEHIND', 'false').lower() == 'true'  # まとめて書き込むか（応答後に書き込むため再起動時に失われうる）
+    FLUSH_INTERVAL = float(os.getenv('POSITION_FLUSH_INTERVAL', '1.0'))                    # 書き込み間隔（秒）
+    MAX_BATCH = int(os.getenv('POSITION_FLUSH_MAX_BATCH', '1000'))                         # 1文で書き込む最大ユーザー数
+    MAX_PENDING_HISTORY = int(os.getenv('POSITION_HISTORY_MAX_PENDING', '100000'))        # 書き込み待ちの位置履歴の上限
+    MAX_ATTEMPTS = int(os.getenv('POSITION_FLUSH_MAX_ATTEMPTS', '3'))                      # 1件あたりの書き込み試行回数の上限
+
+
+class PendingPosition(NamedTuple):
+    """書き込み待ちの位置情報"""
+    lat: float
+    lng: float
+    recorded_at: datetime
+    attempts: int = 0  # 書き込みに失敗した回数
+
+
+class PendingFix(NamedTuple):
+    """書き込み待ちの位置履歴"""
+    user_id: int
+    lat: float
+    lng: float
+    recorded_at: datetime
+    attempts: int = 0  # 書き込みに失敗した回数
+
+
+class PositionWriteBuffer:
+    """
+    位置情報のライトビハインドバッファ
+
+    ユーザーごとに最新の位置のみを保持し、一定間隔で複数行のUPSERT 1文にまとめて書き込む。
+    送信頻度が上がってもDBへの書き込みはユーザー数×書き込み間隔で頭打ちになる。
+    位置履歴（user_position_history）は間引かずに溜めて、同じ間隔で複数行INSERTにまとめて追記する。
+
+    まとめた文が失敗した場合はセーブポイント内で1件ずつ書き直し、失敗した行のみを
+    MAX_ATTEMPTS回まで次回に持ち越す（不正な行が他のユーザーの書き込みを止め続けないようにする）
+    """
+
+    _pending: Dict[int, PendingPosition] = {}
+    _history: List[PendingFix] = []
+    _flush_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def offer(cls, user_id: int, lat: float, lng: float, recorded_at: datetime) -> bool:
+        """
+        位置情報を書き込み待ちに追加する（同じユーザーの古い位置は破棄）
+
+        Args:
+            user_id: ユーザーID
+            lat: 緯度
+            lng: 経度
+            recorded_at: 測位時刻
+
+        Returns:
+            bool: 書き込み待ちに追加した場合True（より新しい位置が既にある場合False）
+        """
+        current = cls._pending.get(user_id)
+        if current is not None:
+            Metrics.incr("position_buffer_coalesced")
+            if current.recorded_at > recorded_at:
+                return False
+        cls._pending[user_id] = PendingPosition(lat, lng, recorded_at)
+        Metrics.incr("position_buffer_offers")
+        return True
+
+    @classmethod
+    def offer_history(cls, fixes: Iterable[Tuple[int, float, float, datetime]]) -> None:
+        """
+        位置履歴を書き込み待ちに追加する（上限を超えた場合は古いものから破棄）
+
+        Args:
+            fixes: (ユーザーID, 緯度, 経度, 測位時刻) の点列
+        """
+        cls._history.extend(PendingFix(*fix) for fix in fixes)
+        cls._trim_history()
+
+    @classmethod
+    def pending_count(cls) -> int:
+        """書き込み待ちのユーザー数を取得する"""
+        return len(cls._pending)
+
+    @classmethod
+    def pending_history_count(cls) -> int:
+        """書き込み待ちの位置履歴の件数を取得する"""
+        return len(cls._history)
+
+    @classmethod
+    async def flush(cls) -> int:
+        """
+        書き込み待ちの位置情報・位置履歴を書き込む
+
+        Returns:
+            int: 書き込んだユーザー数
+        """
+        written = await cls._flush_positions()
+        await cls._flush_history()
+        return written
+
+    @classmethod
+    async def _flush_positions(cls) -> int:
+        """書き込み待ちの現在位置を書き込む"""
+        if not cls._pending:
+            return 0
+        batch, cls._pending = cls._pending, {}
+
+        # ロックの順序をそろえるためユーザーID順に書き込む
+        positions = sorted((user_id, p.lat, p.lng) for user_id, p in batch.items())
+        written = 0
+        for start in range(0, len(positions), PositionBufferConfig.MAX_BATCH):
+            chunk = positions[start:start + PositionBufferConfig.MAX_BATCH]
+            failed: List[int] = []
+            try:
+                async with AsyncSessionLocal() as db:
+                    results = await cls._upsert_isolated(db, chunk, failed)
+                    await db.commit()
+            except Exception as e:
+                print(f"位置情報の書き込みエラー: {e}")
+                failed = [user_id for user_id, _, _ in chunk]
+                results = []
+
+            written += len(results)
+            for result in results:
+                if result.previous is not None:
+                    DestinyPartnerCache.invalidate_positions(result.previous, (result.lat, result.lng))
+                else:
+                    DestinyPartnerCache.invalidate_positions((result.lat, result.lng))
+            for user_id in failed:
+                cls._retry_position(user_id, batch[user_id])
+
+        Metrics.incr("position_buffer_flushes")
+        Metrics.incr("position_buffer_rows_written", written)
+        return written
+
+    @classmethod
+    async def _upsert_isolated(cls, db, chunk: List[Tuple[int, float, float]],
+                               failed: List[int]) -> List[PositionUpsertResult]:
+        """
+        まとめて登録・更新し、失敗した場合は1件ずつセーブポイント内で書き直す
+
+        Args:
+            db: データベースセッション
+            chunk: (ユーザーID, 緯度, 経度) のリスト
+            failed: 書き込めなかったユーザーIDの追加先
+
+        Returns:
+            List[PositionUpsertResult]: 書き込めた位置
+        """
+        try:
+            async with db.begin_nested():
+                return await UserPositionService.upsert_many(db, chunk)
+        except Exception as e:
+            if len(chunk) == 1:
+                print(f"位置情報の書き込みエラー: user_id={chunk[0][0]}, {e}")
+                failed.append(chunk[0][0])
+                return []
+            Metrics.incr("position_buffer_chunk_retries")
+
+        results = []
+        for position in chunk:
+            results.extend(await cls._upsert_isolated(db, [position], failed))
+        return results
+
+    @classmethod
+    def _retry_position(cls, user_id: int, pending: PendingPosition) -> None:
+        """書き込めなかった位置を戻す（その間に届いた新しい位置を優先、上限回数を超えたら破棄）"""
+        attempts = pending.attempts + 1
+        if attempts >= PositionBufferConfig.MAX_ATTEMPTS:
+            print(f"位置情報を破棄しました: user_id={user_id}（{attempts}回失敗）")
+            Metrics.incr("position_buffer_dropped")
+            return
+        current = cls._pending.get(user_id)
+        if current is not None and current.recorded_at >= pending.recorded_at:
+            return
+        cls._pending[user_id] = pending._replace(attempts=attempts)
+        Metrics.incr("position_buffer_flush_errors")
+
+    @classmethod
+    async def _flush_history(cls) -> int:
+        """書き込み待ちの位置履歴を追記する"""
+        if not cls._history:
+            return 0
+        batch, cls._history = cls._history, []
+
+        written = 0
+        retry: List[PendingFix] = []
+        for start in range(0, len(batch), PositionBufferConfig.MAX_BATCH):
+            chunk = batch[start:start + PositionBufferConfig.MAX_BATCH]
+            failed: List[PendingFix] = []
+            try:
+                async with AsyncSessionLocal() as db:
+                    count = await cls._append_isolated(db, chunk, failed)
+                    await db.commit()
+            except Exception as e:
+                print(f"位置履歴の書き込みエラー: {e}")
+                failed, count = list(chunk), 0
+
+            written += count
+            for fix in failed:
+                if fix.attempts + 1 >= PositionBufferConfig.MAX_ATTEMPTS:
+                    Metrics.incr("position_history_dropped")
+                else:
+                    retry.append(fix._replace(attempts=fix.attempts + 1))
+                    Metrics.incr("position_history_flush_errors")
+
+        # 書き込めなかった位置履歴をその間に届いたものより前に戻す
+        cls._history[:0] = retry
+        cls._trim_history()
+        return written
+
+    @classmethod
+    async def _append_isolated(cls, db, chunk: List[PendingFix], failed: List[PendingFix]) -> int:
+        """
+        まとめて追記し、失敗した場合は1件ずつセーブポイント内で書き直す
+
+        Args:
+            db: データベースセッション
+            chunk: 位置履歴
+            failed: 書き込めなかった位置履歴の追加先
+
+        Returns:
+            int: 追記した件数
+        """
+        try:
+            async with db.begin_nested():
+                return await PositionHistoryService.append(db, [fix[:4] for fix in chunk])
+        except Exception as e:
+            if len(chunk) == 1:
+                print(f"位置履歴の書き込みエラー: user_id={chunk[0].user_id}, {e}")
+                failed.append(chunk[0])
+                return 0
+
+        count = 0
+        for fix in chunk:
+            count += await cls._append_isolated(db, [fix], failed)
+        return count
+
+    @classmethod
+    def _trim_history(cls) -> None:
+        """書き込み待ちの位置履歴が上限を超えた場合は古いものから破棄する"""
+        overflow = len(cls._history) - PositionBufferConfig.MAX_PENDING_HISTORY
+        if overflow > 0:
+            del cls._history[:overflow]
+            Metrics.incr("position_history_dropped", overflow)
+
+    @classmethod
+    async def start(cls) -> None:
+        """定期的な書き込みを開始する"""
+        if cls._flush_task is None or cls._flush_task.done():
+            cls._flush_task = asyncio.create_task(cls._flush_forever())
+            Metrics.register_gauge("position_buffer_pending", cls.pending_count)
+            Metrics.register_gauge("position_history_pending", cls.pending_history_count)
+
+    @classmethod
+    async def stop(cls) -> None:
+        """定期的な書き込みを停止し、残りを書き込む"""
+        if cls._flush_task is not None:
+            cls._flush_task.cancel()
+            try:
+                await cls._flush_task
+            except asyncio.CancelledError:
+                pass
+            cls._flush_task = None
+        await cls.flush()
+
+    @classmethod
+    async def _flush_forever(cls) -> None:
+        """FLUSH_INTERVALごとに書き込む"""
+        while True:
+            await asyncio.sleep(PositionBufferConfig.FLUSH_INTERVAL)
+            # 停止時に書き込み中のバッチを失わないようにキャンセルから保護
+            await asyncio.shield(cls.flush())
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from core.metrics import Metrics
+from services.geocell import distance_km
+
+
+class PositionFilterConfig:
+    # 書き込み抑制設定
+    MIN_DISTANCE_M = float(os.getenv('POSITION_MIN_MOVE_METERS', '25'))        # これ未満の移動は書き込まない
+    MAX_SILENCE_SECONDS = float(os.getenv('POSITION_MAX_SILENCE', '300'))      # 移動が無くてもこの間隔で書き込む
+    MAX_ENTRIES = int(os.getenv('POSITION_FILTER_MAX_ENTRIES', '100000'))      # 保持するユーザー数
+
+
+class PositionMovementFilter:
+    """
+    移動していないユーザーの位置情報の書き込みを抑制するフィルタ
+
+    最後に書き込んだ位置をプロセス内に保持し、DBを読まずに判定する
+    """
+
+    _last_written: "OrderedDict[int, Tuple[float, float, float]]" = OrderedDict()  # ユーザーID → (緯度, 経度, 時刻)
+    _lock = threading.Lock()
+
+    @classmethod
+    def accept(cls, user_id: int, lat: float, lng: float) -> bool:
+        """
+        位置情報を書き込むべきか判定する（書き込む場合は最後の位置として記録）
+
+        Args:
+            user_id: ユーザーID
+            lat: 緯度
+            lng: 経度
+
+        Returns:
+            bool: 書き込む場合True（前回から移動距離・経過時間がしきい値未満ならFalse）
+        """
+        now = time.monotonic()
+        with cls._lock:
+            last = cls._last_written.get(user_id)
+            if last is not None:
+                last_lat, last_lng, written_at = last
+                moved_m = distance_km(last_lat, last_lng, lat, lng) * 1000.0
+                if (moved_m < PositionFilterConfig.MIN_DISTANCE_M
+                        and now - written_at < PositionFilterConfig.MAX_SILENCE_SECONDS):
+                    Metrics.incr("position_writes_suppressed")
+                    return False
+
+            cls._last_written[user_id] = (lat, lng, now)
+            cls._last_written.move_to_end(user_id)
+            while len(cls._last_written) > PositionFilterConfig.MAX_ENTRIES:
+                cls._last_written.popitem(last=False)
+
+        Metrics.incr("position_writes_accepted")
+        return True
+
+    @classmethod
+    def forget(cls, user_id: int) -> None:
+        """最後の位置を破棄する（書き込みに失敗した場合など）"""
+        with cls._lock:
+            cls._last_written.pop(user_id, None)
+
+    @classmethod
+    def suppression_rate(cls) -> float:
+        """書き込みを抑制した割合を取得する"""
+        suppressed = Metrics.get("position_writes_suppressed")
+        total = suppressed + Metrics.get("position_writes_accepted")
+        return suppressed / total if total else 0.0
+
+
+Metrics.register_gauge("position_write_suppression_rate", PositionMovementFilter.suppression_rate)
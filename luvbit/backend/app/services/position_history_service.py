@@ -0,0 +1,310 @@
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import false, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import engine
+from core.metrics import Metrics
+from models.user_position_history import UserPositionHistory
+from services.geocell import STORAGE_GRID
+from services.user_position_service import UserPositionService
+
+
+class PositionHistoryConfig:
+    # 位置履歴の保持設定
+    PREMAKE_DAYS = int(os.getenv('POSITION_HISTORY_PREMAKE_DAYS', '7'))             # 先に作成しておく日数
+    RAW_RETENTION_HOURS = int(os.getenv('POSITION_HISTORY_RAW_HOURS', '24'))        # 全ての測位結果を残す時間
+    DOWNSAMPLE_SECONDS = int(os.getenv('POSITION_HISTORY_DOWNSAMPLE', '600'))       # 以降は1ユーザーにつきこの間隔で1件
+    RETENTION_DAYS = int(os.getenv('POSITION_HISTORY_RETENTION_DAYS', '30'))        # DBに残す日数
+    MAX_FUTURE_SECONDS = int(os.getenv('POSITION_HISTORY_MAX_FUTURE', '300'))       # 受け付ける測位時刻の未来方向のずれ
+
+
+class HistoryPartition(NamedTuple):
+    """位置履歴の日単位パーティション"""
+    day: date
+    compacted: bool  # 間引き済みか
+
+
+class PositionFixRecord(NamedTuple):
+    """位置履歴の1件"""
+    user_id: int
+    lat: float
+    lng: float
+    recorded_at: datetime  # UTC（タイムゾーン無し）
+
+
+_PARTITION_NAME = re.compile(r'^user_position_history_p(\d{4})(\d{2})(\d{2})$')
+_COMPACTED_MARK = 'compacted'
+
+
+class PositionHistoryService:
+    """
+    user_position_historyテーブル（追記のみの位置履歴）を扱うサービスクラス
+
+    直近RAW_RETENTION_HOURSは全ての測位結果を残し、それより古い日のパーティションは
+    1ユーザーにつきDOWNSAMPLE_SECONDSごとに1件へ間引く。RETENTION_DAYSを過ぎた日は削除する
+    """
+
+    @staticmethod
+    def to_utc(recorded_at: datetime) -> datetime:
+        """測位時刻をUTC（タイムゾーン無し）に変換する（タイムゾーン無しの場合はUTCとみなす）"""
+        if recorded_at.tzinfo is None:
+            return recorded_at
+        return recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    @classmethod
+    def append_statement(cls, fixes: Iterable[Tuple[int, float, float, datetime]],
+                         now: Optional[datetime] = None):
+        """
+        位置履歴を追記する複数行INSERT文を作成する
+
+        間引き済みのパーティションに生の測位結果が混ざらないよう、
+        RAW_RETENTION_HOURSより古い測位時刻と未来すぎる測位時刻は破棄する
+
+        Args:
+            fixes: (ユーザーID, 緯度, 経度, 測位時刻) の点列
+            now: 現在時刻（UTC、タイムゾーン無し）
+
+        Returns:
+            Optional[Insert]: INSERT文（追記するものが無い場合はNone）
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        oldest = now - timedelta(hours=PositionHistoryConfig.RAW_RETENTION_HOURS)
+        newest = now + timedelta(seconds=PositionHistoryConfig.MAX_FUTURE_SECONDS)
+
+        rows = []
+        for user_id, lat, lng, recorded_at in fixes:
+            recorded_at = cls.to_utc(recorded_at)
+            if not oldest <= recorded_at <= newest:
+                Metrics.incr("position_history_out_of_window")
+                continue
+            rows.append({
+                'user_id': user_id,
+                'lat': lat,
+                'lng': lng,
+                'geocell': STORAGE_GRID.cell_key(lat, lng),
+                'recorded_at': recorded_at
+            })
+        if not rows:
+            return None
+        return pg_insert(UserPositionHistory).values(rows)
+
+    @classmethod
+    async def append(cls, db: AsyncSession, fixes: Iterable[Tuple[int, float, float, datetime]]) -> int:
+        """
+        位置履歴を追記する（コミットは呼び出し側で行う）
+
+        Args:
+            db: データベースセッション
+            fixes: (ユーザーID, 緯度, 経度, 測位時刻) の点列
+
+        Returns:
+            int: 追記した件数
+        """
+        statement = cls.append_statement(fixes)
+        if statement is None:
+            return 0
+        result = await db.execute(statement)
+        Metrics.incr("position_history_rows_written", result.rowcount)
+        return result.rowcount
+
+    @classmethod
+    def window_query(cls, start: datetime, end: datetime,
+                     points: Optional[Iterable[Tuple[float, float]]] = None,
+                     radius_km: Optional[float] = None):
+        """
+        測位時刻が [start, end] の位置履歴を時刻順に取得するSELECT文を作成する
+
+        pointsを指定した場合は経路の各点から半径radius_km以内のセルに絞り込む
+        （セル単位の絞り込みのため、正確な距離の判定は呼び出し側で行う）。
+        recorded_atの範囲で対象のパーティションのみが検索される
+
+        Args:
+            start: 開始時刻
+            end: 終了時刻
+            points: (緯度, 経度) の点列
+            radius_km: 半径（km）
+
+        Returns:
+            Select: user_id, lat, lng, recorded_at を返すSELECT文
+        """
+        query = select(
+            UserPositionHistory.user_id,
+            UserPositionHistory.lat,
+            UserPositionHistory.lng,
+            UserPositionHistory.recorded_at
+        ).where(
+            UserPositionHistory.recorded_at.between(cls.to_utc(start), cls.to_utc(end))
+        )
+        if points is not None:
+            key_ranges = STORAGE_GRID.key_ranges_along_track(points, radius_km or 0.0)
+            if not key_ranges:
+                return query.where(false())
+            query = query.where(UserPositionService.geocell_condition(
+                key_ranges, UserPositionHistory.geocell
+            ).self_group())
+        return query.order_by(UserPositionHistory.recorded_at, UserPositionHistory.user_id)
+
+    @classmethod
+    async def find_in_window(cls, db: AsyncSession, start: datetime, end: datetime,
+                             points: Optional[Iterable[Tuple[float, float]]] = None,
+                             radius_km: Optional[float] = None) -> List[PositionFixRecord]:
+        """
+        測位時刻が [start, end] の位置履歴を時刻順に取得する
+
+        Args:
+            db: データベースセッション
+            start: 開始時刻
+            end: 終了時刻
+            points: (緯度, 経度) の点列（指定した場合は経路の近くのセルに絞り込む）
+            radius_km: 半径（km）
+
+        Returns:
+            List[PositionFixRecord]: 測位時刻順の位置履歴
+        """
+        rows = (await db.execute(cls.window_query(start, end, points, radius_km))).all()
+        return [PositionFixRecord(row.user_id, row.lat, row.lng, row.recorded_at) for row in rows]
+
+    @classmethod
+    def partition_name(cls, day: date) -> str:
+        """日のパーティション名を取得する"""
+        return f"user_position_history_p{day:%Y%m%d}"
+
+    @classmethod
+    def list_partitions(cls) -> List[HistoryPartition]:
+        """
+        アタッチされているパーティションを取得する
+
+        Returns:
+            List[HistoryPartition]: パーティションの日と間引き済みか（日付の昇順）
+        """
+        with engine.connect() as connection:
+            rows = connection.execute(text("""
+                SELECT c.relname, obj_description(c.oid, 'pg_class')
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'user_position_history'::regclass
+            """)).all()
+
+        partitions = []
+        for name, comment in rows:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                partitions.append(HistoryPartition(day, comment == _COMPACTED_MARK))
+        return sorted(partitions)
+
+    @classmethod
+    def ensure_partitions(cls, today: Optional[date] = None) -> List[str]:
+        """
+        今日からPREMAKE_DAYS先までのパーティションを作成する
+
+        Returns:
+            List[str]: 作成したパーティション名
+        """
+        today = today or datetime.now(timezone.utc).date()
+        existing = {partition.day for partition in cls.list_partitions()}
+        created = []
+
+        with engine.begin() as connection:
+            for offset in range(PositionHistoryConfig.PREMAKE_DAYS + 1):
+                day = today + timedelta(days=offset)
+                if day in existing:
+                    continue
+                name = cls.partition_name(day)
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF user_position_history "
+                    f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+                ))
+                created.append(name)
+
+        for name in created:
+            print(f"パーティションを作成しました: {name}")
+        return created
+
+    @classmethod
+    def compact_old_partitions(cls, now: Optional[datetime] = None) -> List[str]:
+        """
+        全体がRAW_RETENTION_HOURSより古い未間引きのパーティションを間引く
+
+        Returns:
+            List[str]: 間引いたパーティション名
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = now - timedelta(hours=PositionHistoryConfig.RAW_RETENTION_HOURS)
+
+        compacted = []
+        for partition in cls.list_partitions():
+            day_end = datetime.combine(partition.day + timedelta(days=1), datetime.min.time())
+            if partition.compacted or day_end > cutoff:
+                continue
+            compacted.append(cls._compact_partition(partition.day))
+        return compacted
+
+    @classmethod
+    def _compact_partition(cls, day: date) -> str:
+        """
+        パーティションを1つ間引く
+
+        DELETEでは削除した行の領域がファイルに残るため、1ユーザーにつき
+        DOWNSAMPLE_SECONDSごとに最後の1件のみを新しいテーブルへ書き出して入れ替える
+        （1トランザクションで行うため、検索側に途中の状態が見えることはない）
+        """
+        name = cls.partition_name(day)
+        compact_name = f"{name}_compact"
+        bucket = "floor(extract(epoch FROM recorded_at) / :interval)"
+
+        with engine.begin() as connection:
+            before = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            connection.execute(text(
+                f"CREATE TABLE {compact_name} (LIKE user_position_history INCLUDING DEFAULTS)"
+            ))
+            after = connection.execute(text(f"""
+                INSERT INTO {compact_name} (id, user_id, lng, lat, geocell, recorded_at, created_at)
+                SELECT DISTINCT ON (user_id, {bucket})
+                    id, user_id, lng, lat, geocell, recorded_at, created_at
+                FROM {name}
+                ORDER BY user_id, {bucket}, recorded_at DESC
+            """), {"interval": PositionHistoryConfig.DOWNSAMPLE_SECONDS}).rowcount
+
+            # 入れ替え（アタッチ時に親テーブルのインデックス・外部キーが作成される）
+            connection.execute(text(f"ALTER TABLE user_position_history DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+            connection.execute(text(f"ALTER TABLE {compact_name} RENAME TO {name}"))
+            connection.execute(text(
+                f"ALTER TABLE user_position_history ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+            ))
+            connection.execute(text(f"COMMENT ON TABLE {name} IS '{_COMPACTED_MARK}'"))
+
+        Metrics.incr("position_history_rows_compacted", before - after)
+        print(f"パーティションを間引きました: {name} ({before}件 → {after}件)")
+        return name
+
+    @classmethod
+    def drop_old_partitions(cls, today: Optional[date] = None) -> List[str]:
+        """
+        保持期間を過ぎたパーティションを削除する
+
+        Returns:
+            List[str]: 削除したパーティション名
+        """
+        today = today or datetime.now(timezone.utc).date()
+        cutoff = today - timedelta(days=PositionHistoryConfig.RETENTION_DAYS)
+
+        dropped = []
+        with engine.begin() as connection:
+            for partition in cls.list_partitions():
+                if partition.day >= cutoff:
+                    continue
+                name = cls.partition_name(partition.day)
+                connection.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+
+        for name in dropped:
+            print(f"パーティションを削除しました: {name}")
+        return dropped
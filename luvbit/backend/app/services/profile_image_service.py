@@ -0,0 +1,262 @@
+import asyncio
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.metrics import Metrics
+from models.profile_image_rendition import ProfileImageRendition
+from services.blob_store import BlobStore
+
+
+class ProfileImageConfig:
+    # 画像配信設定
+    URL_VERSION_LENGTH = 32                                    # URLに含めるハッシュの桁数
+    CACHE_CONTROL = "public, max-age=31536000, immutable"      # バージョン付きURLは内容が変わらない
+
+    # 縮小版の設定
+    SIZES = tuple(int(size) for size in os.getenv('PROFILE_IMAGE_SIZES', '64,256').split(','))  # 長辺のピクセル数
+    FORMATS = ('original', 'webp')                                                              # 出力形式
+    THUMBNAIL_SIZE = 64                                                                         # 一覧のアイコン用
+    WEBP_QUALITY = int(os.getenv('PROFILE_IMAGE_WEBP_QUALITY', '80'))
+    JPEG_QUALITY = int(os.getenv('PROFILE_IMAGE_JPEG_QUALITY', '85'))
+    CACHE_MAX_ENTRIES = int(os.getenv('PROFILE_IMAGE_CACHE_MAX_ENTRIES', '4096'))               # プロセス内キャッシュ件数
+
+
+# 先頭バイトと画像形式の対応
+_MEDIA_TYPES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+class Rendition(NamedTuple):
+    """プロフィール画像の縮小版・変換版"""
+    size: int              # 0は元のサイズ
+    format: str
+    content_type: str
+    blob_hash: str         # ブロブストアのキー
+
+
+class ProfileImageService:
+    """プロフィール画像のURL・ETag・形式判定・縮小版を扱うサービスクラス"""
+
+    _cache: "OrderedDict[Tuple[str, int, str], Rendition]" = OrderedDict()  # (元画像, サイズ, 形式) → 縮小版
+    _lock = threading.Lock()
+
+    @classmethod
+    def url_for(cls, user_id: int, image_hash: Optional[str],
+                size: Optional[int] = None, format: str = 'original') -> Optional[str]:
+        """
+        バージョン付きのプロフィール画像URLを取得する
+
+        URLのバージョンは画像のハッシュなので、画像が変わるとURLも変わる
+
+        Args:
+            user_id: ユーザーID
+            image_hash: プロフィール画像のハッシュ
+            size: 縮小版の長辺のピクセル数（未指定時は元のサイズ）
+            format: 'original' または 'webp'
+
+        Returns:
+            str: 画像URL（画像が無い場合はNone）
+        """
+        if not image_hash:
+            return None
+        url = f"/api/v1/users/{user_id}/image?v={cls.version_of(image_hash)}"
+        if size:
+            url += f"&size={size}"
+        if format != 'original':
+            url += f"&format={format}"
+        return url
+
+    @classmethod
+    def version_of(cls, image_hash: str) -> str:
+        """画像URLのバージョン文字列を取得する"""
+        return image_hash[:ProfileImageConfig.URL_VERSION_LENGTH]
+
+    @classmethod
+    def etag_of(cls, image_hash: str, size: int = 0, format: str = 'original') -> str:
+        """ETagヘッダーの値を取得する"""
+        if not size and format == 'original':
+            return f'"{image_hash}"'
+        return f'"{image_hash}-{size}-{format}"'
+
+    @classmethod
+    def store_original(cls, image: bytes) -> str:
+        """
+        元画像をブロブストアに保存する（users.profile_image_hashに設定する値を返す）
+
+        Args:
+            image: 画像データ
+
+        Returns:
+            str: 画像のハッシュ
+        """
+        return BlobStore.put(image)
+
+    @classmethod
+    def media_type_of(cls, image: bytes) -> str:
+        """
+        画像データの形式を判定する
+
+        Args:
+            image: 画像データ（先頭16バイト以上）
+
+        Returns:
+            str: Content-Type
+        """
+        for signature, media_type in _MEDIA_TYPES:
+            if image.startswith(signature):
+                return media_type
+        if image[:4] == b'RIFF' and image[8:12] == b'WEBP':
+            return 'image/webp'
+        return 'application/octet-stream'
+
+    @classmethod
+    def render(cls, image: bytes, size: int, format: str) -> Rendition:
+        """
+        縮小版・変換版を作成してブロブストアに保存する（CPU処理のためイベントループ外で呼び出す）
+
+        Args:
+            image: 元画像のデータ
+            size: 長辺のピクセル数（0は元のサイズ）
+            format: 'original'（透過があればPNG、無ければJPEG）または 'webp'
+
+        Returns:
+            Rendition: 作成した画像
+        """
+        with Image.open(io.BytesIO(image)) as source:
+            picture = ImageOps.exif_transpose(source)
+            if size:
+                picture.thumbnail((size, size), Image.LANCZOS)
+            has_alpha = picture.mode in ('RGBA', 'LA') or 'transparency' in picture.info
+
+            output = io.BytesIO()
+            if format == 'webp':
+                picture.convert('RGBA' if has_alpha else 'RGB').save(
+                    output, 'WEBP', quality=ProfileImageConfig.WEBP_QUALITY, method=4
+                )
+                content_type = 'image/webp'
+            elif has_alpha:
+                picture.convert('RGBA').save(output, 'PNG', optimize=True)
+                content_type = 'image/png'
+            else:
+                picture.convert('RGB').save(
+                    output, 'JPEG', quality=ProfileImageConfig.JPEG_QUALITY, optimize=True, progressive=True
+                )
+                content_type = 'image/jpeg'
+
+        blob_hash = BlobStore.put(output.getvalue())
+        return Rendition(size=size, format=format, content_type=content_type, blob_hash=blob_hash)
+
+    @classmethod
+    def render_all(cls, image: bytes) -> List[Rendition]:
+        """
+        アップロード時に作成する全ての縮小版・変換版を作成する
+
+        Args:
+            image: 元画像のデータ
+
+        Returns:
+            List[Rendition]: 各サイズの元形式・WebP版と、元のサイズのWebP版
+        """
+        renditions = [cls.render(image, 0, 'webp')]
+        for size in ProfileImageConfig.SIZES:
+            for format in ProfileImageConfig.FORMATS:
+                renditions.append(cls.render(image, size, format))
+        return renditions
+
+    @classmethod
+    def save_renditions_statement(cls, image_hash: str, renditions: List[Rendition]):
+        """
+        縮小版の一覧に登録するINSERT文を作成する（既に登録済みのものは無視）
+
+        同期・非同期どちらのセッションからも実行できるように文のみを返す
+
+        Args:
+            image_hash: 元画像のハッシュ
+            renditions: 保存する画像
+
+        Returns:
+            Insert: INSERT ... ON CONFLICT DO NOTHING 文
+        """
+        return pg_insert(ProfileImageRendition).values([
+            {
+                'image_hash': image_hash,
+                'size': rendition.size,
+                'format': rendition.format,
+                'content_type': rendition.content_type,
+                'blob_hash': rendition.blob_hash,
+            }
+            for rendition in renditions
+        ]).on_conflict_do_nothing(constraint='uq_profile_image_renditions')
+
+    @classmethod
+    async def get_rendition(cls, db: AsyncSession, image_hash: str,
+                            size: int, format: str) -> Optional[Rendition]:
+        """
+        縮小版・変換版を取得する
+
+        プロセス内キャッシュ → DB の順に探し、無ければ元画像から作成して保存する
+
+        Args:
+            db: データベースセッション
+            image_hash: 元画像のハッシュ
+            size: 長辺のピクセル数（0は元のサイズ）
+            format: 'original' または 'webp'
+
+        Returns:
+            Rendition: 画像（元画像が無い場合はNone）
+        """
+        key = (image_hash, size, format)
+        with cls._lock:
+            rendition = cls._cache.get(key)
+            if rendition is not None:
+                cls._cache.move_to_end(key)
+        if rendition is not None:
+            Metrics.incr("profile_image_cache_hits")
+            return rendition
+
+        result = await db.execute(
+            select(
+                ProfileImageRendition.content_type,
+                ProfileImageRendition.blob_hash
+            ).where(
+                ProfileImageRendition.image_hash == image_hash,
+                ProfileImageRendition.size == size,
+                ProfileImageRendition.format == format
+            )
+        )
+        row = result.first()
+        if row is not None:
+            rendition = Rendition(size=size, format=format, content_type=row.content_type, blob_hash=row.blob_hash)
+        else:
+            # アップロード前から存在する画像などは初回のリクエスト時に作成
+            if not BlobStore.exists(image_hash):
+                return None
+            image = await asyncio.to_thread(BlobStore.read, image_hash)
+            rendition = await asyncio.to_thread(cls.render, image, size, format)
+            await db.execute(cls.save_renditions_statement(image_hash, [rendition]))
+            await db.commit()
+            Metrics.incr("profile_image_renditions_created")
+
+        cls._cache_put(key, rendition)
+        return rendition
+
+    @classmethod
+    def _cache_put(cls, key: Tuple[str, int, str], rendition: Rendition) -> None:
+        """縮小版の情報をプロセス内キャッシュに保存する"""
+        with cls._lock:
+            cls._cache[key] = rendition
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > ProfileImageConfig.CACHE_MAX_ENTRIES:
+                cls._cache.popitem(last=False)
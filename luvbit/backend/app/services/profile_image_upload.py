@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import os
+from typing import List, Optional
+
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+from PIL import Image
+
+from core.metrics import Metrics
+from services.blob_store import BlobStore
+from services.profile_image_service import ProfileImageService, Rendition
+
+
+class ProfileImageUploadConfig:
+    # アップロード設定
+    MAX_BYTES = int(os.getenv('PROFILE_IMAGE_MAX_BYTES', str(5 * 1024 * 1024)))   # 画像の最大サイズ
+    MAX_PIXELS = int(os.getenv('PROFILE_IMAGE_MAX_PIXELS', str(40_000_000)))      # 画像の最大画素数
+    MAX_CONCURRENT_RENDERS = int(os.getenv('PROFILE_IMAGE_MAX_RENDERS', '2'))     # 同時に縮小版を作成する数
+    FIELD_NAME = 'file'                                                           # 画像のフォーム項目名
+    ALLOWED_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+    MULTIPART_OVERHEAD = 16 * 1024                                                # 境界・ヘッダー分の余裕
+
+
+class _ImagePartReceiver:
+    """multipartの本文を受け取り、画像部分のみを一時ファイルへ書き出す"""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.found = False
+        self.error: Optional[HTTPException] = None
+        self._pending: List[bytes] = []
+        self._in_image = False
+        self._header_field = b''
+        self._header_value = b''
+        self._headers = {}
+
+    def callbacks(self):
+        return {
+            'on_part_begin': self._on_part_begin,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end,
+        }
+
+    def take_pending(self) -> bytes:
+        """受信済みでファイルに未書き込みのデータを取り出す"""
+        data, self._pending = b''.join(self._pending), []
+        return data
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b''
+        self._header_value = b''
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b'content-disposition', b''))
+        if options.get(b'name', b'').decode('utf-8', 'replace') != ProfileImageUploadConfig.FIELD_NAME:
+            self._in_image = False
+            return
+        if self.found:
+            self._fail(status.HTTP_400_BAD_REQUEST, "画像は1つだけ指定してください")
+            return
+
+        content_type, _ = parse_options_header(self._headers.get(b'content-type', b''))
+        if content_type.decode('latin-1') not in ProfileImageUploadConfig.ALLOWED_TYPES:
+            self._fail(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "対応していない画像形式です")
+            return
+        self.found = True
+        self._in_image = True
+
+    def _on_part_data(self, data, start, end):
+        if not self._in_image or self.error is not None:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > ProfileImageUploadConfig.MAX_BYTES:
+            self._fail(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "画像のサイズが大きすぎます")
+            return
+        if len(self.head) < 16:
+            self.head += chunk[:16 - len(self.head)]
+        self.hasher.update(chunk)
+        self._pending.append(chunk)
+
+    def _on_part_end(self):
+        self._in_image = False
+
+    def _fail(self, status_code: int, detail: str):
+        if self.error is None:
+            self.error = HTTPException(status_code=status_code, detail=detail)
+        self._in_image = False
+
+
+class ProfileImageUploadService:
+    """プロフィール画像のアップロードを受け付けるサービスクラス"""
+
+    _render_semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    async def receive(cls, request: Request) -> str:
+        """
+        multipart/form-dataの画像をストリーミングで受信してブロブストアへ保存する
+
+        本文はチャンク単位で一時ファイルへ書き出しながらハッシュを計算するため、
+        画像のサイズに関わらずメモリ使用量はチャンク分のみ
+
+        Args:
+            request: リクエスト（本文は未読の状態）
+
+        Returns:
+            str: 保存した画像のハッシュ
+
+        Raises:
+            HTTPException: 形式・サイズが不正な場合
+        """
+        content_type, options = parse_options_header(request.headers.get('content-type', ''))
+        boundary = options.get(b'boundary')
+        if content_type != b'multipart/form-data' or not boundary:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="multipart/form-dataで画像を送信してください"
+            )
+
+        # 本文を読む前にContent-Lengthで上限を確認
+        limit = ProfileImageUploadConfig.MAX_BYTES + ProfileImageUploadConfig.MULTIPART_OVERHEAD
+        content_length = request.headers.get('content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="画像のサイズが大きすぎます"
+            )
+
+        fd, tmp_path = BlobStore.temp_file()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                receiver = _ImagePartReceiver()
+                parser = MultipartParser(boundary, receiver.callbacks())
+                received = 0
+                async for chunk in request.stream():
+                    received += len(chunk)
+                    if received > limit:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="画像のサイズが大きすぎます"
+                        )
+                    parser.write(chunk)
+                    if receiver.error is not None:
+                        raise receiver.error
+                    data = receiver.take_pending()
+                    if data:
+                        await asyncio.to_thread(f.write, data)
+                parser.finalize()
+                await asyncio.to_thread(os.fsync, f.fileno())
+
+            if not receiver.found or receiver.size == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"画像（{ProfileImageUploadConfig.FIELD_NAME}）が指定されていません"
+                )
+            # 申告された形式ではなく内容から判定
+            if ProfileImageService.media_type_of(receiver.head) not in ProfileImageUploadConfig.ALLOWED_TYPES:
+                raise HTTPException(
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                    detail="対応していない画像形式です"
+                )
+            await asyncio.to_thread(cls._verify_image, tmp_path)
+
+            image_hash = receiver.hasher.hexdigest()
+            await asyncio.to_thread(BlobStore.commit_file, tmp_path, image_hash)
+            Metrics.incr("profile_image_uploads")
+            Metrics.incr("profile_image_upload_bytes", receiver.size)
+            return image_hash
+
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    async def render_all(cls, image_hash: str) -> List[Rendition]:
+        """
+        保存した画像の縮小版・WebP版を作成する（同時に作成する数を制限）
+
+        Args:
+            image_hash: 画像のハッシュ
+
+        Returns:
+            List[Rendition]: 作成した縮小版
+        """
+        if cls._render_semaphore is None:
+            cls._render_semaphore = asyncio.Semaphore(ProfileImageUploadConfig.MAX_CONCURRENT_RENDERS)
+        async with cls._render_semaphore:
+            image = await asyncio.to_thread(BlobStore.read, image_hash)
+            return await asyncio.to_thread(ProfileImageService.render_all, image)
+
+    @staticmethod
+    def _verify_image(path: str) -> None:
+        """画像として読み込めるか・画素数が上限以内かを確認する"""
+        try:
+            with Image.open(path) as picture:
+                width, height = picture.size
+                picture.verify()
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="画像を読み込めませんでした"
+            )
+        if width * height > ProfileImageUploadConfig.MAX_PIXELS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="画像の解像度が大きすぎます"
+            )
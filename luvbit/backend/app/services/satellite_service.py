@@ -1,9 +1,16 @@
 import random
 import os
-from typing import List, Optional, Tuple, Dict
+from typing import Iterable, List, Optional, Tuple, Dict
 from datetime import datetime, timedelta
 import math
 
+from services.geocell import distance_km
+
+class TemporalMatchConfig:
+    # 時刻を考慮したマッチング設定
+    TRACK_STEP_SECONDS = float(os.getenv('TEMPORAL_TRACK_STEP_SECONDS', '30'))        # 軌道を計算する間隔
+    TIME_TOLERANCE_MINUTES = float(os.getenv('TEMPORAL_TIME_TOLERANCE', '10'))        # 通過時刻との許容差（±）
+
 class SatelliteService:
     """衛星情報を管理するサービスクラス"""
     
@@ -247,36 +254,57 @@ class SatelliteService:
         total_minutes = hours * 60
         
         for minutes in range(0, total_minutes, time_step):
-            # 時間経過による平均近点角の変化
-            delta_mean_anomaly = (360.0 * minutes) / orbital_period
-            current_mean_anomaly = (mean_anomaly + delta_mean_anomaly) % 360.0
-            
-            # 真近点角を計算（簡易：離心率補正は無視）
-            true_anomaly = current_mean_anomaly
-            
-            # 軌道面内の角度位置
-            orbit_angle = (arg_perigee + true_anomaly) % 360.0
-            
-            # 地球自転を考慮した経度補正
-            earth_rotation_rate = 15.0  # 度/時間
-            longitude_shift = (minutes / 60.0) * earth_rotation_rate
-            
-            # 軌道傾斜角を考慮した緯度計算
-            lat_rad = math.radians(inclination * math.sin(math.radians(orbit_angle)))
-            latitude = math.degrees(lat_rad)
-            
-            # 昇交点赤経と地球自転を考慮した経度計算
-            longitude = (raan + orbit_angle - longitude_shift) % 360.0
-            if longitude > 180.0:
-                longitude -= 360.0
-            
-            # 緯度を妥当な範囲に制限
-            latitude = max(-90.0, min(90.0, latitude))
-            
-            positions.append((latitude, longitude))
+            positions.append(cls._orbit_position_at(
+                inclination, raan, arg_perigee, mean_anomaly, orbital_period, minutes
+            ))
         
         return positions
     
+    @classmethod
+    def _orbit_position_at(cls, inclination: float, raan: float, arg_perigee: float,
+                           mean_anomaly: float, orbital_period: float, minutes: float) -> Tuple[float, float]:
+        """
+        軌道要素の基準時刻からminutes分後の地表面位置を計算する（簡易実装）
+        
+        Args:
+            inclination: 軌道傾斜角（度）
+            raan: 昇交点赤経（度）
+            arg_perigee: 近地点引数（度）
+            mean_anomaly: 平均近点角（度）
+            orbital_period: 軌道周期（分）
+            minutes: 基準時刻からの経過時間（分）
+            
+        Returns:
+            Tuple[float, float]: 緯度、経度
+        """
+        # 時間経過による平均近点角の変化
+        delta_mean_anomaly = (360.0 * minutes) / orbital_period
+        current_mean_anomaly = (mean_anomaly + delta_mean_anomaly) % 360.0
+        
+        # 真近点角を計算（簡易：離心率補正は無視）
+        true_anomaly = current_mean_anomaly
+        
+        # 軌道面内の角度位置
+        orbit_angle = (arg_perigee + true_anomaly) % 360.0
+        
+        # 地球自転を考慮した経度補正
+        earth_rotation_rate = 15.0  # 度/時間
+        longitude_shift = (minutes / 60.0) * earth_rotation_rate
+        
+        # 軌道傾斜角を考慮した緯度計算
+        lat_rad = math.radians(inclination * math.sin(math.radians(orbit_angle)))
+        latitude = math.degrees(lat_rad)
+        
+        # 昇交点赤経と地球自転を考慮した経度計算
+        longitude = (raan + orbit_angle - longitude_shift) % 360.0
+        if longitude > 180.0:
+            longitude -= 360.0
+        
+        # 緯度を妥当な範囲に制限
+        latitude = max(-90.0, min(90.0, latitude))
+        
+        return latitude, longitude
+    
     @classmethod
     def _generate_dummy_orbit_track(cls, hours: int) -> List[Tuple[float, float]]:
         """
@@ -294,27 +322,40 @@ class SatelliteService:
         time_step = 5  # 5分間隔
         total_minutes = hours * 60
         
+        for minutes in range(0, total_minutes, time_step):
+            positions.append(cls._dummy_orbit_position_at(minutes))
+        
+        return positions
+    
+    @classmethod
+    def _dummy_orbit_position_at(cls, minutes: float) -> Tuple[float, float]:
+        """
+        ダミー軌道の基準時刻からminutes分後の位置を計算する
+        
+        Args:
+            minutes: 基準時刻からの経過時間（分）
+            
+        Returns:
+            Tuple[float, float]: 緯度、経度
+        """
         # 東京を起点とした軌道風のパス
         base_lat = 35.6762
         base_lng = 139.6503
         
-        for minutes in range(0, total_minutes, time_step):
-            # 時間経過による位置変化をシミュレート
-            time_factor = minutes / 60.0  # 時間
-            
-            # 緯度：±60度の範囲で振動
-            lat_variation = 25.0 * math.sin(time_factor * 0.5)
-            latitude = base_lat + lat_variation
-            
-            # 経度：地球自転と軌道移動を模擬
-            lng_variation = time_factor * 15.0 + 10.0 * math.cos(time_factor * 0.3)
-            longitude = (base_lng + lng_variation) % 360.0
-            if longitude > 180.0:
-                longitude -= 360.0
-            
-            positions.append((latitude, longitude))
+        # 時間経過による位置変化をシミュレート
+        time_factor = minutes / 60.0  # 時間
         
-        return positions
+        # 緯度：±60度の範囲で振動
+        lat_variation = 25.0 * math.sin(time_factor * 0.5)
+        latitude = base_lat + lat_variation
+        
+        # 経度：地球自転と軌道移動を模擬
+        lng_variation = time_factor * 15.0 + 10.0 * math.cos(time_factor * 0.3)
+        longitude = (base_lng + lng_variation) % 360.0
+        if longitude > 180.0:
+            longitude -= 360.0
+        
+        return latitude, longitude
     
     @classmethod
     def find_users_near_ground_track(cls, ground_track: List[Tuple[float, float]], 
@@ -338,45 +379,129 @@ class SatelliteService:
             
             # 衛星軌道上の各ポイントとの距離をチェック
             for sat_lat, sat_lng in ground_track:
-                distance_km = cls._calculate_distance(user_lat, user_lng, sat_lat, sat_lng)
-                if distance_km <= tolerance_km:
+                distance = distance_km(user_lat, user_lng, sat_lat, sat_lng)
+                if distance <= tolerance_km:
                     matched_users.append(user)
                     break  # 一度マッチしたら次のユーザーへ
-
-        matched_users.append(user_positions[0])
         
         return matched_users
     
     @classmethod
-    def _calculate_distance(cls, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    def calculate_timed_ground_track(cls, satellite_name: str, start: datetime, end: datetime,
+                                     step_seconds: Optional[float] = None) -> List[Tuple[datetime, float, float]]:
         """
-        2点間の距離を計算（ハーバーサイン公式）
+        時刻付きの衛星の地表面軌道を計算する
+        
+        TLEの元期を基準にするため、同じ時刻に対しては常に同じ位置になる
         
         Args:
-            lat1, lng1: 地点1の緯度、経度
-            lat2, lng2: 地点2の緯度、経度
+            satellite_name: 衛星名
+            start: 開始時刻（UTC、タイムゾーン無し）
+            end: 終了時刻（UTC、タイムゾーン無し）
+            step_seconds: 計算間隔（秒）
             
         Returns:
-            float: 距離（km）
+            List[Tuple[datetime, float, float]]: (時刻, 緯度, 経度) の時刻順のリスト
         """
-        # 地球の半径（km）
-        R = 6371.0
+        step = timedelta(seconds=step_seconds or TemporalMatchConfig.TRACK_STEP_SECONDS)
+        times = []
+        t = start
+        while t <= end:
+            times.append(t)
+            t += step
         
-        # ラジアンに変換
-        lat1_rad = math.radians(lat1)
-        lng1_rad = math.radians(lng1)
-        lat2_rad = math.radians(lat2)
-        lng2_rad = math.radians(lng2)
+        tle_data = cls.get_satellite_tle_data(satellite_name)
+        if tle_data:
+            try:
+                line1 = tle_data['line1']
+                line2 = tle_data['line2']
+                epoch = cls._parse_tle_epoch(line1)
+                inclination = float(line2[8:16])
+                raan = float(line2[17:25])
+                arg_perigee = float(line2[34:42])
+                mean_anomaly = float(line2[43:51])
+                orbital_period = 24 * 60 / float(line2[52:63])
+                
+                return [
+                    (t, *cls._orbit_position_at(
+                        inclination, raan, arg_perigee, mean_anomaly, orbital_period,
+                        (t - epoch).total_seconds() / 60.0
+                    ))
+                    for t in times
+                ]
+            except (ValueError, IndexError, ZeroDivisionError) as e:
+                print(f"TLEデータの解析に失敗しました: {e}")
         
-        # ハーバーサイン公式
-        dlat = lat2_rad - lat1_rad
-        dlng = lng2_rad - lng1_rad
+        print(f"衛星 {satellite_name} のTLEデータを使用できません。ダミーデータを使用します。")
+        # ダミー軌道もUNIX時刻を基準にして時刻ごとの位置を固定する
+        unix_epoch = datetime(1970, 1, 1)
+        return [
+            (t, *cls._dummy_orbit_position_at((t - unix_epoch).total_seconds() / 60.0))
+            for t in times
+        ]
+    
+    @classmethod
+    def _parse_tle_epoch(cls, line1: str) -> datetime:
+        """
+        TLE Line 1から元期を取得する
+        
+        Args:
+            line1: TLE Line 1
+            
+        Returns:
+            datetime: 元期（UTC、タイムゾーン無し）
+        """
+        year = int(line1[18:20])
+        day_of_year = float(line1[20:32])
+        year += 2000 if year < 57 else 1900
+        return datetime(year, 1, 1) + timedelta(days=day_of_year - 1)
+    
+    @classmethod
+    def find_users_under_timed_track(cls, timed_track: List[Tuple[datetime, float, float]],
+                                     fixes: Iterable[Tuple[int, float, float, datetime]],
+                                     tolerance_km: float = 1.0,
+                                     time_tolerance: Optional[timedelta] = None) -> Dict[int, datetime]:
+        """
+        衛星が通過した時刻の前後にその真下付近にいたユーザーを検索する
         
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+        軌道と測位結果をどちらも時刻順に並べて一度ずつ走査し、各測位結果は
+        測位時刻±time_toleranceの軌道点とのみ比較する（全組み合わせは比較しない）
+        
+        Args:
+            timed_track: (時刻, 緯度, 経度) の軌道
+            fixes: (ユーザーID, 緯度, 経度, 測位時刻) の測位結果
+            tolerance_km: 許容距離（km）
+            time_tolerance: 通過時刻との許容差
+            
+        Returns:
+            Dict[int, datetime]: マッチしたユーザーID → 最初にマッチした測位時刻
+        """
+        if time_tolerance is None:
+            time_tolerance = timedelta(minutes=TemporalMatchConfig.TIME_TOLERANCE_MINUTES)
+        track = sorted(timed_track)
+        # 緯度差だけで許容距離を超える組み合わせはハーバーサインを計算しない
+        tolerance_lat = tolerance_km / 111.32
+        
+        matched: Dict[int, datetime] = {}
+        low = 0   # 比較対象の軌道点の先頭（測位時刻 - 許容差 以降）
+        high = 0  # 比較対象の軌道点の末尾の次（測位時刻 + 許容差 より後）
+        for user_id, user_lat, user_lng, recorded_at in sorted(fixes, key=lambda fix: fix[3]):
+            if user_id in matched:
+                continue
+            while low < len(track) and track[low][0] < recorded_at - time_tolerance:
+                low += 1
+            high = max(high, low)
+            while high < len(track) and track[high][0] <= recorded_at + time_tolerance:
+                high += 1
+            
+            for _, sat_lat, sat_lng in track[low:high]:
+                if abs(sat_lat - user_lat) > tolerance_lat:
+                    continue
+                if distance_km(user_lat, user_lng, sat_lat, sat_lng) <= tolerance_km:
+                    matched[user_id] = recorded_at
+                    break
         
-        distance = R * c
-        return distance
+        return matched
     
     @classmethod
     def find_satellites_near_user(cls, user_lat: float, user_lng: float, 
@@ -413,7 +538,7 @@ class SatelliteService:
                     if ground_track:
                         # 軌道上の各点がユーザー位置に近いかチェック
                         for sat_lat, sat_lng in ground_track:
-                            distance = cls._calculate_distance(user_lat, user_lng, sat_lat, sat_lng)
+                            distance = distance_km(user_lat, user_lng, sat_lat, sat_lng)
                             if distance <= tolerance_km:
                                 matched_satellites.append(satellite_name)
                                 print(f"衛星 {satellite_name} がユーザー位置から{distance:.2f}km以内を通過")
@@ -0,0 +1,224 @@
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Integer, any_, bindparam, func, or_, select, true
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user_position import UserPosition
+from services.geocell import STORAGE_GRID
+
+# 範囲の数がこれを超える場合は BETWEEN の OR ではなくセルキーの配列（1つのパラメータ）で検索する
+MAX_RANGE_SCANS = 64
+
+
+class PositionUpsertResult(NamedTuple):
+    """位置情報の登録・更新結果"""
+    user_id: int
+    lat: float
+    lng: float
+    previous: Optional[Tuple[float, float]]  # 更新前の位置（新規登録の場合はNone）
+
+
+class UserPositionService:
+    """ユーザーの位置情報の書き込み・範囲検索を扱うサービスクラス"""
+
+    @classmethod
+    def upsert_statement(cls, user_id: int, lat: float, lng: float):
+        """
+        位置情報を登録・更新し、更新前の位置も返す1つのSQL文を作成する
+
+        同じ文の中のCTEは更新前のスナップショットを参照するため、
+        prevには更新前の位置が入る
+
+        Args:
+            user_id: ユーザーID
+            lat: 緯度
+            lng: 経度
+
+        Returns:
+            Select: user_id, lat, lng, prev_lat, prev_lng を返すSELECT文
+        """
+        prev = select(
+            UserPosition.lat,
+            UserPosition.lng
+        ).where(
+            UserPosition.user_id == user_id
+        ).cte('prev')
+
+        insert = pg_insert(UserPosition).values(
+            user_id=user_id, lat=lat, lng=lng, geocell=STORAGE_GRID.cell_key(lat, lng)
+        )
+        upsert = insert.on_conflict_do_update(
+            index_elements=[UserPosition.user_id],
+            set_={
+                'lat': insert.excluded.lat,
+                'lng': insert.excluded.lng,
+                'geocell': insert.excluded.geocell,
+                'updated_at': func.now()
+            }
+        ).returning(
+            UserPosition.user_id,
+            UserPosition.lat,
+            UserPosition.lng
+        ).cte('upsert')
+
+        return select(
+            upsert.c.user_id,
+            upsert.c.lat,
+            upsert.c.lng,
+            prev.c.lat.label('prev_lat'),
+            prev.c.lng.label('prev_lng')
+        ).select_from(upsert).outerjoin(prev, true())
+
+    @classmethod
+    def upsert_many_statement(cls, positions: List[Tuple[int, float, float]]):
+        """
+        複数ユーザーの位置情報を1つの複数行INSERT文で登録・更新する文を作成する
+
+        Args:
+            positions: (ユーザーID, 緯度, 経度) のリスト（ユーザーIDは重複不可）
+
+        Returns:
+            Select: user_id, lat, lng, prev_lat, prev_lng を返すSELECT文
+        """
+        user_ids = [user_id for user_id, _, _ in positions]
+        prev = select(
+            UserPosition.user_id,
+            UserPosition.lat,
+            UserPosition.lng
+        ).where(
+            UserPosition.user_id.in_(user_ids)
+        ).cte('prev')
+
+        insert = pg_insert(UserPosition).values([
+            {'user_id': user_id, 'lat': lat, 'lng': lng, 'geocell': STORAGE_GRID.cell_key(lat, lng)}
+            for user_id, lat, lng in positions
+        ])
+        upsert = insert.on_conflict_do_update(
+            index_elements=[UserPosition.user_id],
+            set_={
+                'lat': insert.excluded.lat,
+                'lng': insert.excluded.lng,
+                'geocell': insert.excluded.geocell,
+                'updated_at': func.now()
+            }
+        ).returning(
+            UserPosition.user_id,
+            UserPosition.lat,
+            UserPosition.lng
+        ).cte('upsert')
+
+        return select(
+            upsert.c.user_id,
+            upsert.c.lat,
+            upsert.c.lng,
+            prev.c.lat.label('prev_lat'),
+            prev.c.lng.label('prev_lng')
+        ).select_from(upsert).outerjoin(prev, prev.c.user_id == upsert.c.user_id)
+
+    @classmethod
+    async def upsert_many(cls, db: AsyncSession,
+                          positions: List[Tuple[int, float, float]]) -> List[PositionUpsertResult]:
+        """
+        複数ユーザーの位置情報を1回の問い合わせで登録・更新する（コミットは呼び出し側で行う）
+
+        Args:
+            db: データベースセッション
+            positions: (ユーザーID, 緯度, 経度) のリスト（ユーザーIDは重複不可）
+
+        Returns:
+            List[PositionUpsertResult]: 登録・更新後の位置と更新前の位置
+        """
+        if not positions:
+            return []
+        rows = (await db.execute(cls.upsert_many_statement(positions))).all()
+        return [
+            PositionUpsertResult(
+                user_id=row.user_id,
+                lat=row.lat,
+                lng=row.lng,
+                previous=(row.prev_lat, row.prev_lng) if row.prev_lat is not None else None
+            )
+            for row in rows
+        ]
+
+    @classmethod
+    async def upsert(cls, db: AsyncSession, user_id: int, lat: float, lng: float) -> PositionUpsertResult:
+        """
+        位置情報を1回の問い合わせで登録・更新する（コミットは呼び出し側で行う）
+
+        Args:
+            db: データベースセッション
+            user_id: ユーザーID
+            lat: 緯度
+            lng: 経度
+
+        Returns:
+            PositionUpsertResult: 登録・更新後の位置と更新前の位置
+        """
+        row = (await db.execute(cls.upsert_statement(user_id, lat, lng))).one()
+        previous = (row.prev_lat, row.prev_lng) if row.prev_lat is not None else None
+        return PositionUpsertResult(user_id=row.user_id, lat=row.lat, lng=row.lng, previous=previous)
+
+    @classmethod
+    def geocell_condition(cls, key_ranges: List[Tuple[int, int]], column=UserPosition.geocell):
+        """
+        セルキーの範囲を geocell のインデックスの範囲検索条件に変換する
+
+        Args:
+            key_ranges: (開始キー, 終了キー) のリスト
+            column: セルキーのカラム（既定は user_positions.geocell）
+
+        Returns:
+            ColumnElement: geocell BETWEEN ... OR ... の条件（範囲が多い場合は geocell = ANY(...)）
+        """
+        if len(key_ranges) > MAX_RANGE_SCANS:
+            keys = [key for start, end in key_ranges for key in range(start, end + 1)]
+            return column == any_(bindparam(None, keys, type_=ARRAY(Integer)))
+        return or_(*[
+            column == start if start == end else column.between(start, end)
+            for start, end in key_ranges
+        ])
+
+    @classmethod
+    def within_radius_query(cls, lat: float, lng: float, radius_km: float):
+        """
+        指定地点から半径radius_km以内にいる可能性があるユーザーの位置を取得するSELECT文を作成する
+
+        セル単位の絞り込みのため、正確な距離の判定は呼び出し側で行う
+
+        Args:
+            lat: 緯度
+            lng: 経度
+            radius_km: 半径（km）
+
+        Returns:
+            Select: user_id, lat, lng を返すSELECT文
+        """
+        key_ranges = STORAGE_GRID.key_ranges_within_radius(lat, lng, radius_km)
+        return select(
+            UserPosition.user_id,
+            UserPosition.lat,
+            UserPosition.lng
+        ).where(cls.geocell_condition(key_ranges))
+
+    @classmethod
+    def along_track_query(cls, points: Iterable[Tuple[float, float]], radius_km: float):
+        """
+        経路（点列）のいずれかの点から半径radius_km以内にいる可能性があるユーザーの位置を取得するSELECT文を作成する
+
+        セル単位の絞り込みのため、正確な距離の判定は呼び出し側で行う
+
+        Args:
+            points: (緯度, 経度) の点列
+            radius_km: 半径（km）
+
+        Returns:
+            Select: user_id, lat, lng を返すSELECT文
+        """
+        key_ranges = STORAGE_GRID.key_ranges_along_track(points, radius_km)
+        return select(
+            UserPosition.user_id,
+            UserPosition.lat,
+            UserPosition.lng
+        ).where(cls.geocell_condition(key_ranges))
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from fastapi import HTTPException
+
+from core.security import PasswordHashConfig, get_password_hash, verify_password, verify_password_async
+
+# ログインが集中した時のbcryptの影響を測るベンチマーク（DB不要）
+# イベントループ上で直接検証する場合と、専用スレッドプールで検証する場合（verify_password_async）について
+# ログインのレイテンシと、同時に動く他のリクエストから見たイベントループの遅延を比較する
+#
+# 例: BCRYPT_ROUNDS=12 PASSWORD_HASH_WORKERS=4 python scripts/bench_login_storm.py --logins 200
+
+HEARTBEAT_INTERVAL = 0.01  # イベントループの遅延を測る間隔（秒）
+
+
+def _percentile(values: List[float], ratio: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))] if values else 0.0
+
+
+async def _heartbeat(lags: List[float], stop: asyncio.Event) -> None:
+    """一定間隔で眠り、予定より遅れて起きた時間をイベントループの遅延として記録する"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(time.perf_counter() - started - HEARTBEAT_INTERVAL)
+
+
+async def _storm(name: str, login, logins: int) -> None:
+    """logins件のログインを同時に開始し、結果を表示する"""
+    latencies: List[float] = []
+    rejected = 0
+
+    # 全てのログインが同時に届いたとみなし、レイテンシは開始時刻からの経過時間とする
+    # （イベントループ上で検証する場合は前のログインの検証を待つ時間も含める）
+    async def one_login():
+        nonlocal rejected
+        try:
+            await login()
+        except HTTPException:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await heartbeat
+    print(
+        f"{name}: {len(latencies) / elapsed:,.1f} login/s, "
+        f"p50={_percentile(latencies, 0.5) * 1000:.0f}ms, p99={_percentile(latencies, 0.99) * 1000:.0f}ms, "
+        f"503={rejected}件, "
+        f"ループ遅延 p99={_percentile(lags, 0.99) * 1000:.1f}ms, 最大={max(lags, default=0.0) * 1000:.1f}ms"
+    )
+
+
+async def main(logins: int) -> None:
+    print(
+        f"ログイン数={logins}, BCRYPT_ROUNDS={PasswordHashConfig.BCRYPT_ROUNDS}, "
+        f"スレッド数={PasswordHashConfig.MAX_WORKERS}, 受付上限={PasswordHashConfig.MAX_PENDING}"
+    )
+    hashed = get_password_hash("bench-password")
+
+    async def inline_login():
+        # 変更前の実装（async def内で直接bcryptを実行）
+        verify_password("bench-password", hashed)
+
+    async def executor_login():
+        await verify_password_async("bench-password", hashed)
+
+    await _storm("イベントループ上で検証", inline_login, logins)
+    await _storm("スレッドプールで検証", executor_login, logins)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ログイン集中時のbcryptの影響")
+    parser.add_argument("--logins", type=int, default=100, help="同時に開始するログイン数")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.logins))
+    except Exception as e:
+        print("❌ エラー:", e)
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+
+def test_get_or_create_query_upserts_on_the_user_pair():
+    """ルーム作成は unique_user_pair へのON CONFLICTで既存のルームを返し、xmaxで新規作成かを判定する"""
+    from services.chat_room_service import ChatRoomService
+
+    compiled = ChatRoomService.get_or_create_query(5, 3).compile(dialect=postgresql.dialect())
+    normalized = ' '.join(str(compiled).split())
+
+    assert normalized.startswith('WITH room AS (INSERT INTO chat_rooms (user1_id, user2_id) SELECT')
+    assert 'ON CONFLICT ON CONSTRAINT unique_user_pair DO UPDATE SET user1_id = excluded.user1_id' in normalized
+    assert 'RETURNING chat_rooms.id, xmax = 0 AS created' in normalized
+    assert 'DO NOTHING' not in normalized  # DO NOTHINGでは既存の行がRETURNINGされない
+    # 小さいIDがuser1_id、相手が存在する場合のみ挿入
+    assert list(compiled.params.values())[:3] == [3, 5, 3]
+
+
+@pytest.mark.asyncio
+async def test_create_chat_room_concurrently_returns_one_room(client, db_engine, make_users):
+    """同じ2人のルーム作成が同時に届いても1つのルームになり、一意制約違反にならない"""
+    from models.chat_room import ChatRoom
+
+    user_a, user_b = make_users(2)
+    requests = 200
+
+    async def create(requester, partner):
+        return await client.post(
+            '/chat/rooms',
+            json={'partner_user_id': partner},
+            headers={'X-Test-User-Id': str(requester)}
+        )
+
+    responses = await asyncio.gather(*(
+        create(user_a, user_b) if i % 2 == 0 else create(user_b, user_a)
+        for i in range(requests)
+    ))
+
+    assert [response.status_code for response in responses] == [200] * requests
+    bodies = [response.json() for response in responses]
+    assert len({body['id'] for body in bodies}) == 1
+    assert sum(body['message'] == "チャットルームが作成されました" for body in bodies) == 1
+
+    with db_engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(ChatRoom)).scalar() == 1
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import event, insert, update
+from sqlalchemy.dialects import postgresql
+
+
+def _create_rooms(db_engine, user_id, partner_ids):
+    """ルームと最新メッセージを作成する"""
+    from models.chat_room import ChatRoom
+    from models.message import Message
+
+    with db_engine.begin() as connection:
+        for partner_id in partner_ids:
+            room_id = connection.execute(insert(ChatRoom).values(
+                user1_id=min(user_id, partner_id), user2_id=max(user_id, partner_id)
+            ).returning(ChatRoom.id)).scalar_one()
+            message = connection.execute(insert(Message).values(
+                chat_room_id=room_id, sender_id=partner_id, message_text=f'hello from {partner_id}'
+            ).returning(Message.id, Message.created_at)).one()
+            connection.execute(update(ChatRoom).where(ChatRoom.id == room_id).values(
+                last_message_id=message.id, last_message_at=message.created_at
+            ))
+
+
+def test_inbox_query_is_a_single_select_without_per_room_subqueries():
+    """ルーム一覧は集計列と主キーの結合のみで取得し、ルームごとの副問い合わせ・集計を行わない"""
+    from services.chat_room_service import ChatRoomService
+
+    sql = str(ChatRoomService.inbox_query(1).compile(dialect=postgresql.dialect()))
+    normalized = ' '.join(sql.split())
+
+    assert normalized.count('SELECT') == 1
+    assert 'LEFT OUTER JOIN messages ON messages.id = chat_rooms.last_message_id' in normalized
+    assert 'chat_rooms.user1_unread_count' in normalized
+    assert 'LATERAL' not in normalized
+    assert 'count(' not in normalized
+    assert 'GROUP BY' not in normalized
+    assert normalized.endswith('ORDER BY chat_rooms.updated_at DESC')
+
+
+@pytest.mark.asyncio
+async def test_get_chat_rooms_query_count_is_constant(client, db_engine, make_users):
+    """ルーム一覧のクエリ数はルーム数に関わらず一定"""
+    from core.db import async_engine
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    user_id, *partner_ids = make_users(31)
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', count_statement)
+    try:
+        query_counts = {}
+        created = 0
+        for room_count in (1, 10, 30):
+            _create_rooms(db_engine, user_id, partner_ids[created:room_count])
+            created = room_count
+
+            statements.clear()
+            response = await client.get('/chat/rooms', headers={'X-Test-User-Id': str(user_id)})
+            assert response.status_code == 200
+            rooms = response.json()
+            assert len(rooms) == room_count
+            assert all(room['last_message'].startswith('hello from') for room in rooms)
+            query_counts[room_count] = len(statements)
+    finally:
+        event.remove(async_engine.sync_engine, 'before_cursor_execute', count_statement)
+
+    assert query_counts[1] == query_counts[10] == query_counts[30] == 1
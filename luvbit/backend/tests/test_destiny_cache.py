@@ -0,0 +1,33 @@
+import pytest
+
+from services.destiny_cache import DestinyCacheConfig, DestinyPartnerCache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    DestinyPartnerCache.clear()
+    yield
+    DestinyPartnerCache.clear()
+
+
+def test_make_key_is_shared_between_requesters():
+    """キーは衛星・時間バケット・通過時刻を考慮する時間のみで決まる"""
+    now = 1_700_000_000.0
+    bucket = DestinyCacheConfig.TIME_BUCKET_SECONDS
+
+    assert DestinyPartnerCache.make_key('ISS', now=now) == ('ISS', int(now // bucket), 0)
+    assert DestinyPartnerCache.make_key('ISS', now=now) != DestinyPartnerCache.make_key('ISS', now=now + bucket)
+    assert DestinyPartnerCache.make_key('ISS', now=now) != DestinyPartnerCache.make_key('ISS', now=now, window_hours=3)
+
+
+def test_position_change_near_ground_track_invalidates_entry():
+    """軌道近くのセルでの位置の変化のみがエントリを無効化する"""
+    key = DestinyPartnerCache.make_key('ISS')
+    DestinyPartnerCache.put(key, [1, 2], ground_track=[(35.0, 139.0), (35.1, 139.1)], tolerance_km=1.0)
+    assert DestinyPartnerCache.get(key) == frozenset({1, 2})
+
+    assert DestinyPartnerCache.invalidate_positions((-33.9, 151.2)) == 0
+    assert DestinyPartnerCache.get(key) == frozenset({1, 2})
+
+    assert DestinyPartnerCache.invalidate_positions((-33.9, 151.2), (35.1, 139.1)) == 1
+    assert DestinyPartnerCache.get(key) is None
@@ -0,0 +1,27 @@
+from services.geocell import distance_km
+from services.satellite_service import SatelliteService
+
+
+def test_distance_km():
+    """東京駅〜大阪駅は約400km、同じ地点は0km"""
+    assert 395.0 < distance_km(35.6812, 139.7671, 34.7025, 135.4959) < 410.0
+    assert distance_km(35.0, 139.0, 35.0, 139.0) == 0.0
+
+
+def test_find_users_near_ground_track():
+    """地表面軌道のいずれかの点から許容距離以内のユーザーのみを返す"""
+    ground_track = [(35.0, 139.0), (35.5, 139.5), (36.0, 140.0)]
+    near = {'user_id': 1, 'lat': 35.505, 'lng': 139.505}   # 2点目から約0.7km
+    far = {'user_id': 2, 'lat': 35.25, 'lng': 139.25}      # どの点からも約35km
+
+    matched = SatelliteService.find_users_near_ground_track(ground_track, [near, far], tolerance_km=1.0)
+
+    assert matched == [near]
+
+
+def test_find_users_near_ground_track_matches_user_once():
+    """複数の点に近いユーザーも1回だけ返す"""
+    ground_track = [(35.0, 139.0), (35.0, 139.001)]
+    user = {'user_id': 1, 'lat': 35.0, 'lng': 139.0005}
+
+    assert SatelliteService.find_users_near_ground_track(ground_track, [user], tolerance_km=1.0) == [user]
@@ -0,0 +1,62 @@
+"""add chat room summary columns
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 最新メッセージと参加者ごとの未読数をチャットルームに保持する
+    op.add_column('chat_rooms', sa.Column('last_message_id', sa.Integer(), nullable=True))
+    op.add_column('chat_rooms', sa.Column('last_message_at', sa.TIMESTAMP(), nullable=True))
+    op.add_column('chat_rooms', sa.Column('user1_unread_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('chat_rooms', sa.Column('user2_unread_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # 既存データから集計値を作成
+    op.execute("""
+        UPDATE chat_rooms r
+        SET last_message_id = m.id,
+            last_message_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (chat_room_id) chat_room_id, id, created_at
+            FROM messages
+            ORDER BY chat_room_id, created_at DESC, id DESC
+        ) m
+        WHERE m.chat_room_id = r.id
+    """)
+    op.execute("""
+        UPDATE chat_rooms r
+        SET user1_unread_count = (
+                SELECT count(*) FROM messages m
+                WHERE m.chat_room_id = r.id AND m.sender_id <> r.user1_id AND NOT m.is_read
+            ),
+            user2_unread_count = (
+                SELECT count(*) FROM messages m
+                WHERE m.chat_room_id = r.id AND m.sender_id <> r.user2_id AND NOT m.is_read
+            )
+    """)
+
+    # 未読バッジ用（未読のあるルームのみを対象とした部分インデックス）
+    op.create_index('idx_chat_rooms_user1_unread', 'chat_rooms', ['user1_id', 'user1_unread_count'],
+                    postgresql_where=sa.text('user1_unread_count > 0'))
+    op.create_index('idx_chat_rooms_user2_unread', 'chat_rooms', ['user2_id', 'user2_unread_count'],
+                    postgresql_where=sa.text('user2_unread_count > 0'))
+
+
+def downgrade() -> None:
+    op.drop_index('idx_chat_rooms_user2_unread', table_name='chat_rooms')
+    op.drop_index('idx_chat_rooms_user1_unread', table_name='chat_rooms')
+    op.drop_column('chat_rooms', 'user2_unread_count')
+    op.drop_column('chat_rooms', 'user1_unread_count')
+    op.drop_column('chat_rooms', 'last_message_at')
+    op.drop_column('chat_rooms', 'last_message_id')
@@ -0,0 +1,24 @@
+"""add composite index for message keyset pagination
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (chat_room_id, created_at, id) のカーソルページング用インデックス
+    op.create_index('idx_messages_room_created_id', 'messages', ['chat_room_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_messages_room_created_id', table_name='messages')
@@ -0,0 +1,39 @@
+"""add per participant read watermarks to chat rooms
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 参加者ごとに既読にした最大のメッセージIDを保持する
+    op.add_column('chat_rooms', sa.Column('user1_last_read_message_id', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('chat_rooms', sa.Column('user2_last_read_message_id', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # 既存の既読メッセージから作成
+    op.execute("""
+        UPDATE chat_rooms r
+        SET user1_last_read_message_id = COALESCE((
+                SELECT max(m.id) FROM messages m
+                WHERE m.chat_room_id = r.id AND m.sender_id <> r.user1_id AND m.is_read
+            ), 0),
+            user2_last_read_message_id = COALESCE((
+                SELECT max(m.id) FROM messages m
+                WHERE m.chat_room_id = r.id AND m.sender_id <> r.user2_id AND m.is_read
+            ), 0)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('chat_rooms', 'user2_last_read_message_id')
+    op.drop_column('chat_rooms', 'user1_last_read_message_id')
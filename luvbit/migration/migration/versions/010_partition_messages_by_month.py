@@ -0,0 +1,95 @@
+"""partition messages table by month
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# 現在月から先に作成しておくパーティション数
+PREMAKE_MONTHS = 12
+
+
+def _add_months(month: date, count: int) -> date:
+    total = month.year * 12 + (month.month - 1) + count
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _create_indexes() -> None:
+    op.create_index('idx_messages_chat_room', 'messages', ['chat_room_id'])
+    op.create_index('idx_messages_sender', 'messages', ['sender_id'])
+    op.create_index('idx_messages_created_at', 'messages', ['created_at'])
+    op.create_index('idx_messages_room_created_id', 'messages', ['chat_room_id', 'created_at', 'id'])
+
+
+def upgrade() -> None:
+    # 月単位のレンジパーティションテーブルを作成（主キーにはパーティションキーを含める）
+    op.execute("""
+        CREATE TABLE messages_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            chat_room_id INTEGER NOT NULL REFERENCES chat_rooms (id) ON DELETE CASCADE,
+            sender_id INTEGER NOT NULL REFERENCES users (id),
+            message_text TEXT NOT NULL,
+            message_type VARCHAR(20) NOT NULL DEFAULT 'text',
+            is_read BOOLEAN NOT NULL DEFAULT false,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    # 既存データの最古の月から先の月までパーティションを作成
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM messages")).scalar()
+    today = date.today().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else today
+    while month <= _add_months(today, PREMAKE_MONTHS):
+        op.execute(
+            f"CREATE TABLE messages_p{month:%Y_%m} PARTITION OF messages_partitioned "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+        )
+        month = _add_months(month, 1)
+
+    # データを移行して入れ替え
+    op.execute("""
+        INSERT INTO messages_partitioned (id, chat_room_id, sender_id, message_text, message_type, is_read, created_at)
+        SELECT id, chat_room_id, sender_id, message_text, message_type, is_read, created_at FROM messages
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+    op.drop_table('messages')
+    op.rename_table('messages_partitioned', 'messages')
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+
+    # 親テーブルに作成したインデックスは各パーティションにも作成される
+    _create_indexes()
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE TABLE messages_unpartitioned (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq') PRIMARY KEY,
+            chat_room_id INTEGER NOT NULL REFERENCES chat_rooms (id) ON DELETE CASCADE,
+            sender_id INTEGER NOT NULL REFERENCES users (id),
+            message_text TEXT NOT NULL,
+            message_type VARCHAR(20) NOT NULL DEFAULT 'text',
+            is_read BOOLEAN NOT NULL DEFAULT false,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        INSERT INTO messages_unpartitioned (id, chat_room_id, sender_id, message_text, message_type, is_read, created_at)
+        SELECT id, chat_room_id, sender_id, message_text, message_type, is_read, created_at FROM messages
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+    op.drop_table('messages')  # パーティションも削除される
+    op.rename_table('messages_unpartitioned', 'messages')
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    _create_indexes()
@@ -0,0 +1,31 @@
+"""add trigram index for message search
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 部分一致検索（ILIKE '%...%'）用のトライグラムインデックス
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'idx_messages_text_trgm',
+        'messages',
+        ['message_text'],
+        postgresql_using='gin',
+        postgresql_ops={'message_text': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_messages_text_trgm', table_name='messages')
@@ -0,0 +1,31 @@
+"""add profile image content hash to users
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # プロフィール画像のSHA-256（ETag・画像URLのバージョンに使用）
+    op.add_column('users', sa.Column('profile_image_hash', sa.String(64), nullable=True))
+
+    # 既存の画像から作成
+    op.execute("""
+        UPDATE users
+        SET profile_image_hash = encode(sha256(profile_image), 'hex')
+        WHERE profile_image IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'profile_image_hash')
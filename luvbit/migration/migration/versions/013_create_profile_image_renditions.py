@@ -0,0 +1,34 @@
+"""create profile image renditions table
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # プロフィール画像の縮小版・WebP版（元画像のハッシュ単位で保持）
+    op.create_table('profile_image_renditions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('image_hash', sa.String(64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('format', sa.String(16), nullable=False),
+        sa.Column('content_type', sa.String(32), nullable=False),
+        sa.Column('image', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('image_hash', 'size', 'format', name='uq_profile_image_renditions')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('profile_image_renditions')
@@ -0,0 +1,107 @@
+"""move profile images and renditions out of postgres into the blob store
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+import hashlib
+import os
+import tempfile
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+# バックエンドと同じボリュームをマウントしておくこと（レイアウトは services/blob_store.py と同じ）
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', '/blobs')
+BATCH_SIZE = 100
+
+
+def _blob_path(blob_hash: str) -> str:
+    return os.path.join(BLOB_STORE_DIR, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+
+def _write_blob(data: bytes) -> str:
+    """データをブロブストアに書き込み、SHA-256を返す（既に同じ内容があれば書き込まない）"""
+    blob_hash = hashlib.sha256(data).hexdigest()
+    path = _blob_path(blob_hash)
+    if os.path.exists(path):
+        return blob_hash
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return blob_hash
+
+
+def _read_blob(blob_hash: str) -> bytes:
+    with open(_blob_path(blob_hash), 'rb') as f:
+        return f.read()
+
+
+def _move_out(connection, table: str, data_column: str, hash_column: str) -> None:
+    """BLOBカラムの内容をブロブストアへ書き出し、ハッシュカラムに設定する"""
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(f"""
+            SELECT id, {data_column} FROM {table}
+            WHERE id > :last_id AND {data_column} IS NOT NULL
+            ORDER BY id LIMIT :limit
+        """), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        for row_id, data in rows:
+            connection.execute(
+                sa.text(f"UPDATE {table} SET {hash_column} = :blob_hash WHERE id = :id"),
+                {"blob_hash": _write_blob(bytes(data)), "id": row_id}
+            )
+        last_id = rows[-1][0]
+
+
+def _move_in(connection, table: str, data_column: str, hash_column: str) -> None:
+    """ブロブストアの内容をBLOBカラムへ読み戻す"""
+    rows = connection.execute(sa.text(f"""
+        SELECT id, {hash_column} FROM {table} WHERE {hash_column} IS NOT NULL
+    """)).all()
+    for row_id, blob_hash in rows:
+        connection.execute(
+            sa.text(f"UPDATE {table} SET {data_column} = :data WHERE id = :id"),
+            {"data": _read_blob(blob_hash), "id": row_id}
+        )
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # プロフィール画像（profile_image_hashは画像のSHA-256なのでそのままキーになる）
+    _move_out(connection, 'users', 'profile_image', 'profile_image_hash')
+    op.drop_column('users', 'profile_image')
+
+    # 縮小版
+    op.add_column('profile_image_renditions', sa.Column('blob_hash', sa.String(64), nullable=True))
+    _move_out(connection, 'profile_image_renditions', 'image', 'blob_hash')
+    op.alter_column('profile_image_renditions', 'blob_hash', nullable=False)
+    op.drop_column('profile_image_renditions', 'image')
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+
+    op.add_column('profile_image_renditions', sa.Column('image', sa.LargeBinary(), nullable=True))
+    _move_in(connection, 'profile_image_renditions', 'image', 'blob_hash')
+    op.alter_column('profile_image_renditions', 'image', nullable=False)
+    op.drop_column('profile_image_renditions', 'blob_hash')
+
+    op.add_column('users', sa.Column('profile_image', sa.LargeBinary(), nullable=True))
+    _move_in(connection, 'users', 'profile_image', 'profile_image_hash')
@@ -0,0 +1,57 @@
+"""add geocell column and index to user_positions
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+# services/geocell.py の STORAGE_GRID と同じ値
+CELL_SIZE_DEG = 0.01
+COLS = int(math.ceil(360.0 / CELL_SIZE_DEG))
+ROWS = int(math.ceil(180.0 / CELL_SIZE_DEG))
+BATCH_SIZE = 5000
+
+
+def _cell_key(lat: float, lng: float) -> int:
+    row = int(math.floor((max(-90.0, min(90.0, lat)) + 90.0) / CELL_SIZE_DEG))
+    col = int(math.floor(((lng + 180.0) % 360.0) / CELL_SIZE_DEG))
+    return min(row, ROWS - 1) * COLS + col % COLS
+
+
+def upgrade() -> None:
+    op.add_column('user_positions', sa.Column('geocell', sa.Integer(), nullable=True))
+
+    # 既存の位置からバッチごとに作成（全行を一度に読み込まない）
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text("""
+            SELECT id, lat, lng FROM user_positions
+            WHERE id > :last_id
+            ORDER BY id LIMIT :limit
+        """), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text("UPDATE user_positions SET geocell = :geocell WHERE id = :id"),
+            [{"geocell": _cell_key(lat, lng), "id": row_id} for row_id, lat, lng in rows]
+        )
+        last_id = rows[-1][0]
+
+    op.create_index('idx_user_positions_geocell', 'user_positions', ['geocell'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_user_positions_geocell', table_name='user_positions')
+    op.drop_column('user_positions', 'geocell')
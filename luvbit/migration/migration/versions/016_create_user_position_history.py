@@ -0,0 +1,52 @@
+"""create user_position_history table partitioned by day
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+# 今日から先に作成しておくパーティション数（以降は compact_position_history.py で作成）
+PREMAKE_DAYS = 7
+
+
+def upgrade() -> None:
+    # 日単位のレンジパーティションテーブルを作成（主キーにはパーティションキーを含める）
+    op.execute("""
+        CREATE TABLE user_position_history (
+            id BIGSERIAL NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            lng DOUBLE PRECISION NOT NULL,
+            lat DOUBLE PRECISION NOT NULL,
+            geocell INTEGER NOT NULL,
+            recorded_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+
+    # 測位時刻はUTCで保存する。受け付けるのは直近24時間以降のため、昨日の分から作成
+    today = datetime.now(timezone.utc).date()
+    for offset in range(-1, PREMAKE_DAYS + 1):
+        day = today + timedelta(days=offset)
+        op.execute(
+            f"CREATE TABLE user_position_history_p{day:%Y%m%d} PARTITION OF user_position_history "
+            f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+        )
+
+    # 親テーブルに作成したインデックスは各パーティションにも作成される
+    op.create_index('idx_user_position_history_user_recorded', 'user_position_history', ['user_id', 'recorded_at'])
+    op.create_index('idx_user_position_history_geocell_recorded', 'user_position_history', ['geocell', 'recorded_at'])
+
+
+def downgrade() -> None:
+    op.drop_table('user_position_history')  # パーティションも削除される